@@ -4,16 +4,16 @@ Migration script to add 'trading' tag to all existing books.
 This is a one-time script to tag existing books in the library.
 """
 
+import json
 import os
-import pickle
 from pathlib import Path
 
-from reader3 import Book, save_to_pickle
+from reader3 import Book, load_from_pickle, save_to_pickle
 
 
 def migrate_trading_tags():
     """Add 'trading' tag to all existing books that don't have it."""
-    books_dir = Path(".")
+    books_dir = "."
     migrated_count = 0
     skipped_count = 0
 
@@ -21,10 +21,14 @@ def migrate_trading_tags():
     print()
 
     # Find all book data directories
-    for item in books_dir.iterdir():
-        if not item.is_dir() or not item.name.endswith("_data"):
-            continue
-
+    with os.scandir(books_dir) as entries:
+        book_dirs = [
+            Path(entry.path)
+            for entry in entries
+            if entry.name.endswith("_data") and entry.is_dir(follow_symlinks=False)
+        ]
+
+    for item in book_dirs:
         book_pkl = item / "book.pkl"
         if not book_pkl.exists():
             print(f"⚠️  Skipping {item.name}: No book.pkl found")
@@ -32,13 +36,18 @@ def migrate_trading_tags():
 
         # Load the book
         try:
-            with open(book_pkl, "rb") as f:
-                book = pickle.load(f)
+            book = load_from_pickle(str(book_pkl))
 
             # Ensure tags attribute exists (backward compatibility)
             if not hasattr(book.metadata, "tags"):
                 book.metadata.tags = []
 
+            # The server keeps edited tags in meta.json, not the pickle
+            meta_json = item / "meta.json"
+            meta = json.loads(meta_json.read_text()) if meta_json.exists() else None
+            if meta is not None:
+                book.metadata.tags = meta.get("tags", book.metadata.tags)
+
             # Check if 'trading' tag already exists
             if "trading" in book.metadata.tags:
                 print(f"✓  {book.metadata.title}: Already has 'trading' tag")
@@ -48,8 +57,16 @@ def migrate_trading_tags():
             # Add 'trading' tag
             book.metadata.tags.append("trading")
 
-            # Save updated book
-            save_to_pickle(book, str(item))
+            if meta is not None:
+                # Tags are read from meta.json, so only that needs rewriting;
+                # the rest of it (e.g. source_digest) stays as it is
+                meta["tags"] = book.metadata.tags
+                temp_file = meta_json.with_suffix(".json.tmp")
+                temp_file.write_text(json.dumps(meta))
+                os.replace(temp_file, meta_json)
+            else:
+                # Added without the server (e.g. with the CLI): tags live in the pickle
+                save_to_pickle(book, str(item))
 
             print(f"✓  {book.metadata.title}: Added 'trading' tag")
             migrated_count += 1
@@ -57,6 +74,10 @@ def migrate_trading_tags():
         except Exception as e:
             print(f"✗  Error processing {item.name}: {e}")
 
+    if migrated_count:
+        # A running server re-lists the library when the directory mtime changes
+        os.utime(books_dir)
+
     print()
     print(f"Migration complete!")
     print(f"  Migrated: {migrated_count} book(s)")
@@ -4,14 +4,16 @@ Parses an EPUB file into a structured object that can be used to serve the book
 
 import os
 import pickle
+import re
 import shutil
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from html import escape
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 from urllib.parse import unquote
 
 import ebooklib
+import zstandard
 from ebooklib import epub
 from pypdf import PdfReader
 from bs4 import BeautifulSoup, Comment
@@ -27,7 +29,8 @@ class ChapterContent:
     id: str           # Internal ID (e.g., 'item_1')
     href: str         # Filename (e.g., 'part01.html')
     title: str        # Best guess title from file
-    content: str      # Cleaned HTML with rewritten image paths
+    content: Optional[str]  # Cleaned HTML with rewritten image paths; None once
+                            # saved, load it with load_chapter_content()
     text: str         # Plain text for search/LLM context
     order: int        # Linear reading order
 
@@ -72,6 +75,11 @@ class Book:
 
 # --- Utilities ---
 
+# Anything other than letters, digits, '_', '-' and '.' is dropped from file
+# names we write: extracted images here, uploads in server.py
+UNSAFE_FILENAME_CHARS = re.compile(r"[^\w.-]+")
+
+
 def clean_html_content(soup: BeautifulSoup) -> BeautifulSoup:
 
     # Remove dangerous/useless tags
@@ -199,7 +207,7 @@ def process_epub(epub_path: str, output_dir: str) -> Book:
             # Normalize filename
             original_fname = os.path.basename(item.get_name())
             # Sanitize filename for OS
-            safe_fname = "".join([c for c in original_fname if c.isalpha() or c.isdigit() or c in '._-']).strip()
+            safe_fname = UNSAFE_FILENAME_CHARS.sub("", original_fname)
 
             # Save to disk
             local_path = os.path.join(images_dir, safe_fname)
@@ -356,11 +364,71 @@ def process_pdf(pdf_path: str, output_dir: str) -> Book:
     return final_book
 
 
-def save_to_pickle(book: Book, output_dir: str):
+# Frame magic number, to tell compressed pickles from older plain ones
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def chapter_path(output_dir: str, index: int) -> str:
+    return os.path.join(output_dir, 'chapters', f'{index}.html')
+
+
+def save_to_pickle(book: Book, output_dir: str, protocol: int = pickle.HIGHEST_PROTOCOL) -> Book:
+    """
+    Pickle the book (zstd-compressed), writing each chapter's HTML to
+    chapters/<index>.html so that opening one chapter doesn't mean
+    unpickling all of them.
+    Chapters that are already on disk (content None) are left as they are.
+    Returns the book as pickled, i.e. with every chapter's content None.
+    """
+    os.makedirs(os.path.join(output_dir, 'chapters'), exist_ok=True)
+    spine = []
+    for i, chapter in enumerate(book.spine):
+        if chapter.content is not None:
+            with open(chapter_path(output_dir, i), 'w', encoding='utf-8') as f:
+                f.write(chapter.content)
+        spine.append(replace(chapter, content=None))
+
     p_path = os.path.join(output_dir, 'book.pkl')
+    stored = replace(book, spine=spine)
+    data = pickle.dumps(stored, protocol=protocol)
     with open(p_path, 'wb') as f:
-        pickle.dump(book, f)
+        f.write(zstandard.ZstdCompressor(level=3).compress(data))
     print(f"Saved structured data to {p_path}")
+    return stored
+
+
+def load_from_pickle(p_path: str) -> Book:
+    """Load a book.pkl; zstd-compressed unless it was saved by an older version."""
+    with open(p_path, 'rb') as f:
+        data = f.read()
+    if data[:4] == ZSTD_MAGIC:
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return pickle.loads(data)
+
+
+def load_chapter_content(output_dir: str, book: Book, index: int) -> str:
+    """HTML of spine item `index`, from the pickle (older books) or chapters/."""
+    content = book.spine[index].content
+    if content is not None:
+        return content
+    with open(chapter_path(output_dir, index), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def process_book(input_file: str, output_dir: str) -> Book:
+    """
+    Process an .epub or .pdf into output_dir and pickle the result. Returns
+    the book as pickled (chapter content on disk), which is also what
+    load_from_pickle would give back.
+    """
+    if input_file.lower().endswith(".pdf"):
+        book = process_pdf(input_file, output_dir)
+    elif input_file.lower().endswith(".epub"):
+        book = process_epub(input_file, output_dir)
+    else:
+        raise ValueError("Unsupported file type; only .epub or .pdf")
+
+    return save_to_pickle(book, output_dir)
 
 
 # --- CLI ---
@@ -376,14 +444,7 @@ if __name__ == "__main__":
     assert os.path.exists(input_file), "File not found."
     out_dir = os.path.splitext(input_file)[0] + "_data"
 
-    if input_file.lower().endswith(".pdf"):
-        book_obj = process_pdf(input_file, out_dir)
-    elif input_file.lower().endswith(".epub"):
-        book_obj = process_epub(input_file, out_dir)
-    else:
-        raise ValueError("Unsupported file type; only .epub or .pdf")
-
-    save_to_pickle(book_obj, out_dir)
+    book_obj = process_book(input_file, out_dir)
     print("\n--- Summary ---")
     print(f"Title: {book_obj.metadata.title}")
     print(f"Authors: {', '.join(book_obj.metadata.authors)}")
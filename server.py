@@ -4,20 +4,34 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-import pickle
+import io
+import hashlib
 import shutil
-import json
+import multiprocessing
+import orjson
 import uuid
 import secrets
+import tempfile
 import time
-from functools import lru_cache
-from typing import Optional, Dict, List, Any
+import threading
+import asyncio
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextvars import ContextVar, copy_context
+from itertools import groupby
+from typing import Optional, Dict, List, Any, Deque
+from dataclasses import replace
 from datetime import datetime
 from pathlib import Path
 
+from cachetools import LFUCache
 from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Form
-from fastapi.responses import HTMLResponse, FileResponse, Response, RedirectResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse, Response, RedirectResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
 from fastapi.templating import Jinja2Templates
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 
@@ -26,9 +40,11 @@ from reader3 import (
     BookMetadata,
     ChapterContent,
     TOCEntry,
-    process_epub,
-    process_pdf,
-    save_to_pickle,
+    UNSAFE_FILENAME_CHARS,
+    chapter_path,
+    load_chapter_content,
+    load_from_pickle,
+    process_book,
 )
 
 # --- Authentication Configuration ---
@@ -38,7 +54,7 @@ COOKIE_NAME = "llmreader_auth"
 SESSION_DURATION = 30 * 24 * 60 * 60  # 30 days in seconds
 
 # Rate limiting for failed login attempts
-LOGIN_ATTEMPTS: Dict[str, List[float]] = {}  # IP -> list of timestamps
+LOGIN_ATTEMPTS: Dict[str, Deque[float]] = defaultdict(deque)  # IP -> timestamps, oldest first
 MAX_ATTEMPTS = 5
 RATE_LIMIT_WINDOW = 15 * 60  # 15 minutes
 
@@ -71,19 +87,21 @@ def verify_cookie(cookie: Optional[str]) -> bool:
 def check_rate_limit(ip: str) -> bool:
     """Check if IP is under rate limit. Returns True if allowed."""
     now = time.time()
-    attempts = LOGIN_ATTEMPTS.get(ip, [])
-    # Remove attempts older than the window
-    attempts = [t for t in attempts if now - t < RATE_LIMIT_WINDOW]
-    LOGIN_ATTEMPTS[ip] = attempts
+    attempts = LOGIN_ATTEMPTS.get(ip)
+    if attempts is None:
+        return True
+    # Drop attempts older than the window from the front
+    while attempts and now - attempts[0] >= RATE_LIMIT_WINDOW:
+        attempts.popleft()
+    if not attempts:
+        del LOGIN_ATTEMPTS[ip]
+        return True
     return len(attempts) < MAX_ATTEMPTS
 
 
 def record_failed_attempt(ip: str) -> None:
     """Record a failed login attempt for rate limiting."""
-    now = time.time()
-    if ip not in LOGIN_ATTEMPTS:
-        LOGIN_ATTEMPTS[ip] = []
-    LOGIN_ATTEMPTS[ip].append(now)
+    LOGIN_ATTEMPTS[ip].append(time.time())
 
 
 def get_client_ip(request: Request) -> str:
@@ -102,7 +120,6 @@ def get_client_ip(request: Request) -> str:
 
 def _hash_password(password: str) -> str:
     """Create a keyed hash of the password using HMAC-SHA256."""
-    import hashlib
     import hmac
     return hmac.new(
         SECRET_KEY.encode("utf-8"),
@@ -111,12 +128,15 @@ def _hash_password(password: str) -> str:
     ).hexdigest()
 
 
+# The configured password never changes at runtime, so hash it once
+_STORED_HASH = _hash_password(AUTH_PASSWORD)
+
+
 def verify_password(input_password: str) -> bool:
     """Verify password using HMAC hashes and constant-time comparison."""
-    # Hash both passwords with the secret key, then compare hashes
+    # Hash the input with the secret key, then compare against the stored hash
     input_hash = _hash_password(input_password)
-    stored_hash = _hash_password(AUTH_PASSWORD)
-    return secrets.compare_digest(input_hash, stored_hash)
+    return secrets.compare_digest(input_hash, _STORED_HASH)
 
 
 def is_https(request: Request) -> bool:
@@ -129,7 +149,10 @@ def is_https(request: Request) -> bool:
     return request.url.scheme == "https"
 
 
-app = FastAPI(root_path="/reader")
+# Handlers that return dicts are rendered with orjson. The big payloads
+# return an ORJSONResponse themselves, which also skips the
+# jsonable_encoder pass FastAPI makes over a returned dict.
+app = FastAPI(root_path="/reader", default_response_class=ORJSONResponse)
 templates = Jinja2Templates(directory="templates")
 
 # Mount static files directory
@@ -167,23 +190,24 @@ async def serve_manifest():
 
 
 # --- Authentication Middleware ---
+
+# Paths served without a login, with and without the /reader root path:
+# the login route (GET and POST), Service Worker and manifest...
+PUBLIC_EXACT_PATHS = frozenset({
+    "/login", "/reader/login",
+    "/sw.js", "/reader/sw.js",
+    "/manifest.json", "/reader/manifest.json",
+})
+# ...and static files (CSS, JS, etc.)
+PUBLIC_PATH_PREFIXES = ("/static/", "/reader/static/")
+
+
 @app.middleware("http")
 async def auth_middleware(request: Request, call_next):
     """Protect all routes except /login and /static."""
     path = request.url.path
 
-    # Allow login route (both GET and POST)
-    if path == "/login" or path == "/reader/login":
-        return await call_next(request)
-
-    # Allow static files (CSS, JS, etc.)
-    if path.startswith("/static/") or path.startswith("/reader/static/"):
-        return await call_next(request)
-
-    # Allow Service Worker and manifest
-    if path == "/sw.js" or path == "/reader/sw.js":
-        return await call_next(request)
-    if path == "/manifest.json" or path == "/reader/manifest.json":
+    if path in PUBLIC_EXACT_PATHS or path.startswith(PUBLIC_PATH_PREFIXES):
         return await call_next(request)
 
     # Allow book images (served from /read/{book_id}/images/ or /reader/read/{book_id}/images/)
@@ -205,8 +229,16 @@ async def auth_middleware(request: Request, call_next):
     return await call_next(request)
 
 
-# Where are the book folders located?
-BOOKS_DIR = "."
+# Where are the book folders located? A context variable rather than a
+# module global so a caller (e.g. a test) can point one context at another
+# library without affecting the rest of the process.
+BOOKS_DIR_VAR: ContextVar[str] = ContextVar("BOOKS_DIR", default=".")
+
+
+def books_dir() -> str:
+    """The books directory for the current context."""
+    return BOOKS_DIR_VAR.get()
+
 
 # Highlights storage
 HIGHLIGHTS_FILE = "highlights.json"
@@ -214,6 +246,12 @@ HIGHLIGHTS_FILE = "highlights.json"
 # Reading progress storage
 PROGRESS_FILE = "reading_progress.json"
 
+# Book images only change when a book is re-imported; the ETag covers that case
+IMAGE_CACHE_CONTROL = "public, max-age=86400"
+
+# Lightweight listing data, stored next to each book's pickle
+BOOK_META_FILE = "meta.json"
+
 # Highlight tag limits
 MAX_HIGHLIGHT_TAGS = 12
 MAX_HIGHLIGHT_TAG_LENGTH = 30
@@ -222,7 +260,7 @@ MAX_HIGHLIGHT_TAG_LENGTH = 30
 def _sanitize_filename(filename: str, fallback_ext: str) -> str:
     """Return a filesystem-safe filename, ensuring an extension exists."""
     base = os.path.basename(filename or "")
-    safe = "".join([c for c in base if c.isalnum() or c in ("-", "_", ".")]).strip(".")
+    safe = UNSAFE_FILENAME_CHARS.sub("", base).strip(".")
     if not safe:
         safe = f"upload{fallback_ext}"
     if not os.path.splitext(safe)[1]:
@@ -230,32 +268,312 @@ def _sanitize_filename(filename: str, fallback_ext: str) -> str:
     return safe
 
 
+# Processes used to parse uploads; parsing is CPU-bound, so threads would
+# serialize on the GIL. Created on first upload.
+UPLOAD_PROCESS_WORKERS = min(4, os.cpu_count() or 1)
+_UPLOAD_POOL: Optional[ProcessPoolExecutor] = None
+_UPLOAD_POOL_LOCK = threading.Lock()
+
+
+def get_upload_pool() -> ProcessPoolExecutor:
+    global _UPLOAD_POOL
+    with _UPLOAD_POOL_LOCK:
+        if _UPLOAD_POOL is None:
+            # spawn: forking a process that is running threads isn't safe
+            _UPLOAD_POOL = ProcessPoolExecutor(
+                max_workers=UPLOAD_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _UPLOAD_POOL
+
+
+def discard_upload_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Drop a pool that has broken (a worker died, e.g. OOM-killed on a large
+    PDF) so the next get_upload_pool() starts a fresh one. A broken pool
+    never recovers on its own.
+    """
+    global _UPLOAD_POOL
+    with _UPLOAD_POOL_LOCK:
+        if _UPLOAD_POOL is pool:
+            _UPLOAD_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_in_upload_pool(fn, *args):
+    """
+    Run fn(*args) in the upload pool, replacing the pool and retrying once
+    if it turns out to be broken. A second failure is raised to the caller.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = get_upload_pool()
+        try:
+            return await loop.run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            discard_upload_pool(pool)
+            if attempt:
+                raise
+
+
+# Buffer size for copying uploads that are still held in memory
+UPLOAD_COPY_BUFFER = 8 * 1024 * 1024
+
+
+def copy_upload(src, dest_path: str) -> None:
+    """
+    Copy an uploaded file object to dest_path. Uploads that have been spooled
+    to disk are copied with os.sendfile (in-kernel), small in-memory ones with
+    a large-buffer copyfileobj. Blocking; run it in a threadpool.
+    """
+    src.seek(0)
+    # SpooledTemporaryFile.fileno() would force an in-memory upload to disk
+    on_disk = getattr(src, "_rolled", True) and hasattr(os, "sendfile")
+
+    with open(dest_path, "wb") as dest:
+        if on_disk:
+            try:
+                src_fd = src.fileno()
+                size = os.fstat(src_fd).st_size
+            except (AttributeError, OSError, ValueError):
+                on_disk = False
+            else:
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(dest.fileno(), src_fd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+        if not on_disk:
+            shutil.copyfileobj(src, dest, UPLOAD_COPY_BUFFER)
+
+
+def file_digest(path: str) -> str:
+    """BLAKE2b hex digest of a file's contents. Blocking; run it in a threadpool."""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_COPY_BUFFER):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 # --- Highlights Storage Functions ---
+#
+# highlights.json is a snapshot; single-highlight create/update/delete calls
+# append one operation to highlights.log instead of rewriting the snapshot.
+# Loading replays the log on top of the snapshot, and the log is folded back
+# into the snapshot once it outgrows it (or on any full save). Both are
+# fsynced, the snapshot before the log it replaces is removed.
+
+# Compact once the log is this many times the snapshot size (and at least
+# HIGHLIGHTS_LOG_MIN_COMPACT bytes, so small libraries don't compact constantly)
+HIGHLIGHTS_LOG_COMPACT_RATIO = 2
+HIGHLIGHTS_LOG_MIN_COMPACT = 64 * 1024
+
+
+def highlights_log_path() -> str:
+    return os.path.splitext(HIGHLIGHTS_FILE)[0] + ".log"
+
+
+def apply_highlight_op(highlights: Dict[str, Any], op: Dict[str, Any]) -> None:
+    """Apply one logged operation. Ops are idempotent so replaying is safe."""
+    book_highlights = highlights.setdefault(op["book_id"], {"highlights": []})["highlights"]
+    kind = op["op"]
+
+    if kind == "create":
+        highlight = op["highlight"]
+        if not any(hl.get("id") == highlight["id"] for hl in book_highlights):
+            book_highlights.append(highlight)
+    elif kind == "update":
+        for hl in book_highlights:
+            if hl.get("id") == op["id"]:
+                hl.update(op["fields"])
+                break
+    elif kind == "delete":
+        book_highlights[:] = [hl for hl in book_highlights if hl.get("id") != op["id"]]
+
+
+# Process-wide highlights, parsed once per HIGHLIGHTS_FILE and updated on
+# write. "version" goes up with every change, for the views built from them.
+_HIGHLIGHTS_CACHE: Dict[str, Any] = {"file": None, "version": 0, "data": None}
+
+# highlight_id -> (book_id, position in that book's list) for the cached highlights
+_HIGHLIGHT_INDEX: Dict[str, tuple[str, int]] = {}
+
+# Guards the highlights files, _HIGHLIGHTS_CACHE and _HIGHLIGHT_INDEX. Held
+# from file I/O through to the cache update, which happen in the threadpool.
+# Re-entrant, since an append that triggers compaction saves the snapshot.
+_HIGHLIGHTS_LOCK = threading.RLock()
+
+
+def highlights_cache_is_fresh() -> bool:
+    return _HIGHLIGHTS_CACHE["data"] is not None and _HIGHLIGHTS_CACHE["file"] == HIGHLIGHTS_FILE
+
+
+def set_highlights_cache(highlights: Dict[str, Any]) -> None:
+    """Make `highlights` the cached copy and rebuild the id index for it."""
+    _HIGHLIGHTS_CACHE.update({
+        "file": HIGHLIGHTS_FILE,
+        "version": _HIGHLIGHTS_CACHE["version"] + 1,
+        "data": highlights,
+    })
+    _HIGHLIGHT_INDEX.clear()
+    for book_id, book_data in highlights.items():
+        for idx, highlight in enumerate(book_data.get("highlights", [])):
+            _HIGHLIGHT_INDEX[str(highlight.get("id", ""))] = (book_id, idx)
+
 
 def load_highlights() -> Dict[str, Any]:
-    """Load highlights from JSON file."""
-    if not os.path.exists(HIGHLIGHTS_FILE):
-        return {}
+    """
+    Return all highlights. Parsed from disk on first use and kept in memory
+    afterwards; callers that mutate the result must persist it with
+    save_highlights.
+    """
+    with _HIGHLIGHTS_LOCK:
+        if not highlights_cache_is_fresh():
+            set_highlights_cache(read_highlights_file())
+        return _HIGHLIGHTS_CACHE["data"]
+
+
+def apply_highlight_op_to_cache(op: Dict[str, Any]) -> None:
+    """apply_highlight_op for the cached highlights, using and maintaining the id index."""
+    highlights = _HIGHLIGHTS_CACHE["data"]
+    book_id = op["book_id"]
+    highlight_id = op["highlight"]["id"] if op["op"] == "create" else op["id"]
+    location = _HIGHLIGHT_INDEX.get(highlight_id)
+
+    if op["op"] == "create":
+        if location is None:
+            book_highlights = highlights.setdefault(book_id, {"highlights": []})["highlights"]
+            book_highlights.append(op["highlight"])
+            _HIGHLIGHT_INDEX[highlight_id] = (book_id, len(book_highlights) - 1)
+    elif location is not None:
+        book_highlights = highlights[location[0]]["highlights"]
+        idx = location[1]
+        if op["op"] == "update":
+            book_highlights[idx].update(op["fields"])
+        elif op["op"] == "delete":
+            del book_highlights[idx]
+            del _HIGHLIGHT_INDEX[highlight_id]
+            # Shift the positions of the highlights that followed it
+            for pos in range(idx, len(book_highlights)):
+                _HIGHLIGHT_INDEX[str(book_highlights[pos].get("id", ""))] = (location[0], pos)
+
+
+def read_highlights_file() -> Dict[str, Any]:
+    """Load highlights from the JSON snapshot plus the operation log."""
+    highlights: Dict[str, Any] = {}
+
+    if os.path.exists(HIGHLIGHTS_FILE):
+        try:
+            highlights = orjson.loads(Path(HIGHLIGHTS_FILE).read_bytes())
+        except Exception as e:
+            print(f"Error loading highlights: {e}")
+            return {}
 
     try:
-        with open(HIGHLIGHTS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading highlights: {e}")
-        return {}
+        with open(highlights_log_path(), 'rb') as f:
+            for line in f:
+                try:
+                    apply_highlight_op(highlights, orjson.loads(line))
+                except Exception as e:
+                    # e.g. a partial line from an interrupted write
+                    print(f"Skipping bad highlights log entry: {e}")
+    except FileNotFoundError:
+        pass
+
+    return highlights
 
 
 def save_highlights(highlights: Dict[str, Any]) -> None:
-    """Save highlights to JSON file atomically."""
-    try:
-        # Write to temp file first, then rename (atomic)
-        temp_file = HIGHLIGHTS_FILE + '.tmp'
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            json.dump(highlights, f, indent=2, ensure_ascii=False)
-        os.replace(temp_file, HIGHLIGHTS_FILE)
-    except Exception as e:
-        print(f"Error saving highlights: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to save highlights: {e}")
+    """
+    Save highlights to JSON file atomically, folding in the operation log.
+    Blocking; run it in a threadpool.
+    """
+    with _HIGHLIGHTS_LOCK:
+        try:
+            # Write to temp file first, then rename (atomic)
+            temp_file = HIGHLIGHTS_FILE + '.tmp'
+            with open(temp_file, 'wb') as f:
+                f.write(orjson.dumps(highlights, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+                # Durable before the rename, since the log is deleted right after
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, HIGHLIGHTS_FILE)
+            # The snapshot now contains every logged operation
+            if os.path.exists(highlights_log_path()):
+                os.remove(highlights_log_path())
+            set_highlights_cache(highlights)
+        except Exception as e:
+            print(f"Error saving highlights: {e}")
+            # The caller may have mutated the cached dict; re-read from disk next time
+            _HIGHLIGHTS_CACHE["data"] = None
+            raise HTTPException(status_code=500, detail=f"Failed to save highlights: {e}")
+
+
+def append_highlight_op(op: Dict[str, Any]) -> None:
+    """Record a single-highlight change in the log, compacting when it gets large."""
+    append_highlight_ops([op])
+
+
+def append_highlight_ops(ops: List[Dict[str, Any]]) -> None:
+    """
+    Record several highlight changes with one log write. Blocking (it
+    fsyncs, and may compact); run it in a threadpool.
+    """
+    with _HIGHLIGHTS_LOCK:
+        log_path = highlights_log_path()
+        try:
+            with open(log_path, 'a+b') as f:
+                lines = b"".join(orjson.dumps(op) + b"\n" for op in ops)
+                # Don't glue onto a partial line left by an interrupted write
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        lines = b"\n" + lines
+                f.write(lines)
+                # One fsync per write request (not per op), so an acknowledged
+                # highlight survives a crash or power loss
+                f.flush()
+                os.fsync(f.fileno())
+                log_size = f.tell()
+        except Exception as e:
+            print(f"Error saving highlights: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to save highlights: {e}")
+
+        if highlights_cache_is_fresh():
+            for op in ops:
+                apply_highlight_op_to_cache(op)
+            _HIGHLIGHTS_CACHE["version"] += 1
+
+        try:
+            snapshot_size = os.path.getsize(HIGHLIGHTS_FILE)
+        except OSError:
+            snapshot_size = 0
+        if log_size > max(HIGHLIGHTS_LOG_COMPACT_RATIO * snapshot_size, HIGHLIGHTS_LOG_MIN_COMPACT):
+            save_highlights(load_highlights())
+
+
+def update_highlights(build_ops) -> Any:
+    """
+    Run build_ops() -> (ops, result) and log the ops, all under
+    _HIGHLIGHTS_LOCK so the highlights build_ops looked up can't change
+    before the write. Blocking; run it in a threadpool. Returns result.
+    """
+    with _HIGHLIGHTS_LOCK:
+        ops, result = build_ops()
+        if ops:
+            append_highlight_ops(ops)
+        return result
+
+
+def remove_book_highlights(book_id: str) -> None:
+    """Drop all of book_id's highlights. Blocking; run it in a threadpool."""
+    with _HIGHLIGHTS_LOCK:
+        highlights = load_highlights()
+        if book_id in highlights:
+            del highlights[book_id]
+            save_highlights(highlights)
 
 
 # --- Reading Progress Storage Functions ---
@@ -265,8 +583,7 @@ def load_progress() -> Dict[str, Any]:
     if not os.path.exists(PROGRESS_FILE):
         return {}
     try:
-        with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return orjson.loads(Path(PROGRESS_FILE).read_bytes())
     except Exception as e:
         print(f"Error loading progress: {e}")
         return {}
@@ -276,14 +593,41 @@ def save_progress(progress: Dict[str, Any]) -> None:
     """Save reading progress to JSON file atomically."""
     try:
         temp_file = PROGRESS_FILE + '.tmp'
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            json.dump(progress, f, indent=2, ensure_ascii=False)
+        Path(temp_file).write_bytes(
+            orjson.dumps(progress, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        )
         os.replace(temp_file, PROGRESS_FILE)
     except Exception as e:
         print(f"Error saving progress: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to save progress: {e}")
 
 
+# Serializes progress read-modify-writes, which run in the threadpool
+_PROGRESS_LOCK = threading.Lock()
+
+
+def update_progress(book_id: str, update) -> Dict[str, Any]:
+    """
+    Load progress, apply update(entry or None) -> entry for book_id and save,
+    all under _PROGRESS_LOCK so concurrent requests don't drop each other's
+    writes. Blocking; run it in a threadpool. Returns the new entry.
+    """
+    with _PROGRESS_LOCK:
+        progress = load_progress()
+        progress[book_id] = update(progress.get(book_id))
+        save_progress(progress)
+        return progress[book_id]
+
+
+def remove_progress(book_id: str) -> None:
+    """Drop book_id's progress under _PROGRESS_LOCK. Blocking; run it in a threadpool."""
+    with _PROGRESS_LOCK:
+        progress = load_progress()
+        if book_id in progress:
+            del progress[book_id]
+            save_progress(progress)
+
+
 def normalize_highlight_tags(tags_input: Any) -> List[str]:
     """Normalize tags for highlights: lowercase, trimmed, unique, capped."""
     if tags_input is None:
@@ -366,81 +710,107 @@ def get_highlight_by_id(highlight_id: str) -> tuple[Optional[str], Optional[Dict
     """
     highlights = load_highlights()
 
-    for book_id, book_data in highlights.items():
-        for idx, highlight in enumerate(book_data.get('highlights', [])):
-            if highlight.get('id') == highlight_id:
-                return book_id, highlight, idx
+    location = _HIGHLIGHT_INDEX.get(highlight_id)
+    if location is None:
+        return None, None, None
+
+    book_id, idx = location
+    return book_id, highlights[book_id]["highlights"][idx], idx
+
+
+def highlight_chapter_index(highlight: Dict) -> int:
+    return highlight.get('chapter_index', 0)
+
+
+def group_by_chapter(book_highlights: List[Dict]) -> List[tuple[int, List[Dict]]]:
+    """
+    [(chapter_index, highlights)] in chapter order, keeping each chapter's
+    highlights in their stored order. One stable sort, then a single pass.
+    """
+    ordered = sorted(book_highlights, key=highlight_chapter_index)
+    return [
+        (ch_idx, list(group))
+        for ch_idx, group in groupby(ordered, key=highlight_chapter_index)
+    ]
 
-    return None, None, None
+
+# Rendered exports: filter_book_id -> (highlights_view_key(), markdown)
+_EXPORT_CACHE: Dict[str, tuple[tuple, str]] = {}
+EXPORT_CACHE_ENTRIES = 64
+
+
+def highlights_view_key() -> tuple:
+    """
+    Changes whenever grouped_highlights() or an export could: any highlights
+    write or a book being added or removed (BOOKS_DIR mtime).
+    """
+    load_highlights()
+    try:
+        books_mtime = os.stat(books_dir()).st_mtime_ns
+    except OSError:
+        books_mtime = None
+    return (HIGHLIGHTS_FILE, _HIGHLIGHTS_CACHE["version"], books_dir(), books_mtime)
 
 
 def export_to_obsidian_markdown(filter_book_id: str = "") -> str:
     """
     Export highlights to Obsidian-compatible markdown format.
     If filter_book_id is provided, only export that book's highlights.
-    Returns markdown string.
+    Returns markdown string, reused until highlights_view_key() changes.
     """
-    highlights = load_highlights()
+    key = highlights_view_key()
+    cached = _EXPORT_CACHE.get(filter_book_id)
+    if cached is not None and cached[0] == key:
+        return cached[1]
 
-    if not highlights:
-        return "# Reading Highlights\n\nNo highlights yet."
-
-    lines = ["# Reading Highlights\n"]
+    markdown = build_obsidian_markdown(filter_book_id)
+    if len(_EXPORT_CACHE) >= EXPORT_CACHE_ENTRIES:
+        _EXPORT_CACHE.clear()
+    _EXPORT_CACHE[filter_book_id] = (key, markdown)
+    return markdown
 
-    book_ids = [filter_book_id] if filter_book_id and filter_book_id in highlights else sorted(highlights.keys())
-    for book_id in book_ids:
-        book_data = highlights[book_id]
-        book_highlights = [
-            hydrate_highlight_record(hl)
-            for hl in book_data.get('highlights', [])
-        ]
 
-        if not book_highlights:
-            continue
-
-        # Load book to get title
-        book = load_book_cached(book_id)
-        book_title = book.metadata.title if book else book_id
+def build_obsidian_markdown(filter_book_id: str = "") -> str:
+    """Render the export_to_obsidian_markdown output from scratch."""
+    highlights = load_highlights()
 
-        lines.append(f"\n## [[{book_title}]]\n")
+    if not highlights:
+        return "# Reading Highlights\n\nNo highlights yet."
 
-        # Group by chapter
-        by_chapter: Dict[int, List[Dict]] = {}
-        for hl in book_highlights:
-            ch_idx = hl.get('chapter_index', 0)
-            if ch_idx not in by_chapter:
-                by_chapter[ch_idx] = []
-            by_chapter[ch_idx].append(hl)
+    # Every block after the title starts with a blank-line separator
+    buf = io.StringIO()
+    buf.write("# Reading Highlights\n")
 
-        for ch_idx in sorted(by_chapter.keys()):
-            chapter_highlights = by_chapter[ch_idx]
+    grouped = grouped_highlights()
+    if filter_book_id and filter_book_id in highlights:
+        book_views = [grouped[filter_book_id]] if filter_book_id in grouped else []
+    else:
+        book_views = list(grouped.values())
 
-            # Get chapter title
-            if book and ch_idx < len(book.spine):
-                chapter_title = book.spine[ch_idx].title
-            else:
-                chapter_title = f"Chapter {ch_idx + 1}"
+    for book_view in book_views:
+        buf.write(f"\n\n## [[{book_view['title']}]]\n")
 
-            lines.append(f"\n### {chapter_title}\n")
+        for chapter in book_view["chapters"]:
+            buf.write(f"\n\n### {chapter['title']}\n")
 
-            for hl in chapter_highlights:
+            for hl in chapter["highlights"]:
                 # Add highlight text as blockquote
                 text = hl.get('text', '').strip()
-                lines.append(f"> {text}\n")
+                buf.write(f"\n> {text}\n")
 
                 # Add block reference
                 hl_id = hl.get('id', 'unknown')
-                lines.append(f"^{hl_id}\n")
+                buf.write(f"\n^{hl_id}\n")
 
                 # Add note if present
                 note = hl.get('note', '').strip()
                 if note:
-                    lines.append(f"Note: {note}\n")
+                    buf.write(f"\nNote: {note}\n")
 
                 tags = hl.get('tags', [])
                 if tags:
                     tag_line = " ".join(f"#{tag}" for tag in tags)
-                    lines.append(f"Tags: {tag_line}\n")
+                    buf.write(f"\nTags: {tag_line}\n")
 
                 # Add timestamp
                 timestamp = hl.get('timestamp', '')
@@ -448,39 +818,277 @@ def export_to_obsidian_markdown(filter_book_id: str = "") -> str:
                     try:
                         dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
                         formatted_date = dt.strftime('%Y-%m-%d')
-                        lines.append(f"Created: {formatted_date}\n")
+                        buf.write(f"\nCreated: {formatted_date}\n")
                     except:
                         pass
 
-                lines.append("\n---\n")
+                buf.write("\n\n---\n")
+
+    return buf.getvalue()
 
-    return "\n".join(lines)
 
+# grouped_highlights() result and the highlights_view_key() it was built for
+_GROUPED_CACHE: Dict[str, Any] = {"key": None, "data": None}
 
-@lru_cache(maxsize=32)
-def load_book_cached(folder_name: str) -> Optional[Book]:
+
+def grouped_highlights() -> Dict[str, Dict[str, Any]]:
     """
-    Loads the book from the pickle file.
-    Cached so we don't re-read the disk on every click.
+    Highlights of every book that has any, in book_id order, grouped for
+    display: {book_id: {"book_id", "title", "author", "found",
+    "total_highlights", "chapters": [{"index", "title", "highlights"}]}}.
+    "found" is False when the book itself can't be loaded (title falls back
+    to the book_id). Shared by the /highlights page and the markdown export
+    and reused until highlights_view_key() changes; treat it as read-only.
     """
-    file_path = os.path.join(BOOKS_DIR, folder_name, "book.pkl")
-    if not os.path.exists(file_path):
+    with _HIGHLIGHTS_LOCK:
+        key = highlights_view_key()
+        if _GROUPED_CACHE["key"] == key:
+            return _GROUPED_CACHE["data"]
+        # Copy the highlights so books load without holding up writers
+        snapshot = [
+            (book_id, [hydrate_highlight_record(hl) for hl in data.get('highlights', [])])
+            for book_id, data in sorted(load_highlights().items())
+        ]
+
+    grouped: Dict[str, Dict[str, Any]] = {}
+    for book_id, book_highlights in snapshot:
+        # Skip empty buckets before paying for a book load
+        if not book_highlights:
+            continue
+
+        book = load_book_cached(book_id)
+
+        chapters = []
+        for ch_idx, chapter_highlights in group_by_chapter(book_highlights):
+            if book and ch_idx < len(book.spine):
+                chapter_title = book.spine[ch_idx].title
+            else:
+                chapter_title = f"Chapter {ch_idx + 1}"
+            chapters.append({
+                "index": ch_idx,
+                "title": chapter_title,
+                "highlights": chapter_highlights
+            })
+
+        grouped[book_id] = {
+            "book_id": book_id,
+            "title": book.metadata.title if book else book_id,
+            "author": ", ".join(book.metadata.authors) if book else "",
+            "found": book is not None,
+            "total_highlights": len(book_highlights),
+            "chapters": chapters,
+        }
+
+    _GROUPED_CACHE.update({"key": key, "data": grouped})
+    return grouped
+
+
+def book_pickle_mtime(folder_name: str) -> Optional[int]:
+    """st_mtime_ns of a book's pickle, or None if the folder has no book."""
+    try:
+        return os.stat(os.path.join(books_dir(), folder_name, "book.pkl")).st_mtime_ns
+    except OSError:
         return None
 
+
+class BookCache:
+    """
+    A small least-frequently-used cache. get() and assignment count as a
+    use; peek() reads without one, so a pass over the whole library can't
+    promote books nobody is reading. Not thread-safe; callers hold a lock.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: Dict[Any, list] = {}  # key -> [value, uses]
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        entry[1] += 1
+        return entry[0]
+
+    def peek(self, key, default=None):
+        entry = self._entries.get(key)
+        return default if entry is None else entry[0]
+
+    def uses(self, key) -> int:
+        entry = self._entries.get(key)
+        return 0 if entry is None else entry[1]
+
+    def __setitem__(self, key, value) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[0] = value
+            entry[1] += 1
+            return
+        if len(self._entries) >= self.maxsize:
+            # Evict the least used entry; ties go to the oldest
+            victim = min(self._entries, key=lambda k: self._entries[k][1])
+            del self._entries[victim]
+        self._entries[key] = [value, 1]
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Parsed books keyed by pickle path, each stored with the mtime it was read
+# at. LFU rather than LRU so a pass over the whole library can't evict the
+# books that are actually being read.
+BOOK_CACHE_SIZE = 256
+_BOOK_CACHE = BookCache(maxsize=BOOK_CACHE_SIZE)
+_BOOK_CACHE_LOCK = threading.Lock()
+
+
+def load_book_cached(
+    folder_name: str, scan: bool = False, mtime: Optional[int] = None
+) -> Optional[Book]:
+    """
+    Loads the book from the pickle file, with its tags from meta.json.
+    Cached on the pickle's path and mtime, so a re-processed book is picked
+    up without clearing the whole cache; a tag edit only re-reads the tags.
+    Library scans pass scan=True: they reuse cached books without counting
+    as a use, and the books they load aren't added to the cache. Callers
+    that have just stat'ed the pickle can pass its mtime.
+    """
+    file_path = os.path.join(books_dir(), folder_name, "book.pkl")
+    if mtime is None:
+        mtime = book_pickle_mtime(folder_name)
     try:
-        with open(file_path, "rb") as f:
-            book = pickle.load(f)
+        meta_mtime = os.stat(book_meta_path(folder_name)).st_mtime_ns
+    except OSError:
+        meta_mtime = None
+
+    with _BOOK_CACHE_LOCK:
+        if mtime is None:
+            _BOOK_CACHE.pop(file_path, None)
+            return None
+        cached = _BOOK_CACHE.peek(file_path) if scan else _BOOK_CACHE.get(file_path)
+
+    if cached is not None and cached[0] == mtime:
+        book = cached[2]
+        if cached[1] == meta_mtime:
+            return book
+    else:
+        book = _read_book_pickle(file_path)
+        if book is None:
+            return None
+
+    # Tags are edited in meta.json only, so the pickle's copy may be stale.
+    # Other threads may hold the cached Book; graft the tags onto a copy.
+    meta = load_book_meta(folder_name) if meta_mtime is not None else None
+    if meta is not None:
+        tags = meta.get("tags", book.metadata.tags)
+        book = replace(book, metadata=replace(book.metadata, tags=tags))
+
+    if not scan:
+        with _BOOK_CACHE_LOCK:
+            _BOOK_CACHE[file_path] = (mtime, meta_mtime, book)
+    return book
+
+
+def seed_book_cache(folder_name: str, book: Book) -> None:
+    """
+    Cache a book that has just been pickled (e.g. the Book an upload worker
+    returns), so the first read doesn't unpickle what we already hold.
+    """
+    file_path = os.path.join(books_dir(), folder_name, "book.pkl")
+    mtime = book_pickle_mtime(folder_name)
+    if mtime is None:
+        return
+    try:
+        meta_mtime = os.stat(book_meta_path(folder_name)).st_mtime_ns
+    except OSError:
+        meta_mtime = None
+    with _BOOK_CACHE_LOCK:
+        _BOOK_CACHE[file_path] = (mtime, meta_mtime, book)
+
+
+def _read_book_pickle(file_path: str) -> Optional[Book]:
+    try:
+        book = load_from_pickle(file_path)
 
         # Migration: Add tags field for old books (version 3.0)
         if not hasattr(book.metadata, 'tags'):
             book.metadata.tags = []
 
         return book
+    except FileNotFoundError:
+        return None
     except Exception as e:
-        print(f"Error loading book {folder_name}: {e}")
+        print(f"Error loading book {file_path}: {e}")
         return None
 
 
+def clear_book_cache() -> None:
+    with _BOOK_CACHE_LOCK:
+        _BOOK_CACHE.clear()
+    with _CHAPTER_CACHE_LOCK:
+        _CHAPTER_CACHE.clear()
+    with _CHAPTER_PAGE_CACHE_LOCK:
+        _CHAPTER_PAGE_CACHE.clear()
+
+
+load_book_cached.cache_clear = clear_book_cache
+
+
+# Chapter HTML, which lives in chapters/<index>.html rather than the pickle.
+# Keyed by file path with the mtime it was read at; bounded by total size.
+CHAPTER_CACHE_BYTES = 64 * 1024 * 1024
+_CHAPTER_CACHE: LFUCache = LFUCache(
+    maxsize=CHAPTER_CACHE_BYTES, getsizeof=lambda entry: len(entry[1])
+)
+_CHAPTER_CACHE_LOCK = threading.Lock()
+
+# Rendered reader pages: (book dir, chapter index) -> (book.pkl mtime, HTML
+# bytes). LFU so the few chapters a reader keeps returning to stay cached.
+CHAPTER_PAGE_CACHE_BYTES = 128 * 1024 * 1024
+_CHAPTER_PAGE_CACHE: LFUCache = LFUCache(
+    maxsize=CHAPTER_PAGE_CACHE_BYTES, getsizeof=lambda entry: len(entry[1])
+)
+_CHAPTER_PAGE_CACHE_LOCK = threading.Lock()
+
+
+def get_chapter_content(book_id: str, book: Book, index: int) -> str:
+    """
+    HTML of one spine item, read through the chapter cache. Raises a 404 if
+    its chapters/<index>.html is missing (e.g. an interrupted save).
+    """
+    if book.spine[index].content is not None:
+        # Processed before chapters were stored separately
+        return book.spine[index].content
+
+    book_dir = os.path.join(books_dir(), book_id)
+    file_path = chapter_path(book_dir, index)
+    try:
+        mtime = os.stat(file_path).st_mtime_ns
+        with _CHAPTER_CACHE_LOCK:
+            cached = _CHAPTER_CACHE.get(file_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        content = load_chapter_content(book_dir, book, index)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Chapter content not found")
+
+    with _CHAPTER_CACHE_LOCK:
+        try:
+            _CHAPTER_CACHE[file_path] = (mtime, content)
+        except ValueError:
+            pass  # larger than the whole cache
+    return content
+
+
 # --- Authentication Routes ---
 
 @app.get("/login", response_class=HTMLResponse)
@@ -559,37 +1167,198 @@ def find_cover_image(book, book_id: str) -> str | None:
     return None
 
 
-@app.get("/", response_class=HTMLResponse)
-async def library_view(request: Request):
-    """Lists all available processed books."""
+# --- Library Listing ---
+
+def book_meta_path(book_id: str) -> str:
+    return os.path.join(books_dir(), book_id, BOOK_META_FILE)
+
+
+def book_meta_entry(
+    book: Book,
+    book_id: str,
+    mtime: Optional[int] = None,
+    source_digest: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    The subset of a book needed to list it in the library, plus the digest
+    of the uploaded file it was processed from (None for CLI-added books).
+    """
+    return {
+        "title": book.metadata.title,
+        "authors": book.metadata.authors,
+        "chapters": len(book.spine),
+        "tags": getattr(book.metadata, 'tags', []),
+        "cover_image": find_cover_image(book, book_id),
+        "processed_at": getattr(book, 'processed_at', '2000-01-01'),
+        "mtime": mtime if mtime is not None else book_pickle_mtime(book_id),
+        "source_digest": source_digest,
+    }
+
+
+def load_book_meta(book_id: str) -> Optional[Dict[str, Any]]:
+    """Load a book's meta.json, or None if it is missing or unreadable."""
+    try:
+        return orjson.loads(Path(book_meta_path(book_id)).read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error loading meta for {book_id}: {e}")
+        return None
+
+
+def save_book_meta(
+    book_id: str,
+    book: Book,
+    mtime: Optional[int] = None,
+    source_digest: Optional[str] = None,
+    raise_errors: bool = False,
+) -> Dict[str, Any]:
+    """
+    Write a book's meta.json atomically and return the entry. A failed write
+    is only logged, unless raise_errors: meta.json is the sole copy of
+    edited tags, but for anything else the next library scan rewrites it
+    from the pickle.
+    """
+    entry = book_meta_entry(book, book_id, mtime, source_digest)
+    meta_path = book_meta_path(book_id)
+    temp_file = meta_path + '.tmp'
+    try:
+        Path(temp_file).write_bytes(orjson.dumps(entry))
+        os.replace(temp_file, meta_path)
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"Error saving meta for {book_id}: {e}")
+    return entry
+
+
+# Library listing cache, rebuilt only when BOOKS_DIR's mtime changes
+_LIBRARY_CACHE: Dict[str, Any] = {"dir": None, "mtime": 0, "data": None}
+
+# Serializes library listing rebuilds (scans run in the threadpool)
+_LIBRARY_LOCK = threading.Lock()
+
+# Threads used to load books whose meta.json is missing or out of date
+LIBRARY_SCAN_WORKERS = 8
+
+
+def invalidate_library_cache() -> None:
+    """Force the next library scan to rebuild the listing."""
+    _LIBRARY_CACHE["mtime"] = 0
+
+
+def reset_caches() -> None:
+    """
+    Drop every in-process cache: books, chapters, rendered pages, the
+    library listing, highlights and the views built from them. For tests
+    and anything else that points books_dir() or HIGHLIGHTS_FILE elsewhere.
+    """
+    clear_book_cache()
+    with _LIBRARY_LOCK:
+        _LIBRARY_CACHE.update({"dir": None, "mtime": 0, "data": None})
+    _HIGHLIGHTS_CACHE.update({"file": None, "data": None})
+    _HIGHLIGHT_INDEX.clear()
+    _EXPORT_CACHE.clear()
+    _GROUPED_CACHE.update({"key": None, "data": None})
+
+
+def scan_library() -> tuple[List[Dict[str, Any]], set]:
+    """
+    Returns (books, all_tags) for every *_data folder with a loadable book.
+    Listing data comes from each folder's meta.json; only folders without
+    one (e.g. added with the CLI) or whose book.pkl mtime no longer matches
+    are unpickled. Cached on the mtime of BOOKS_DIR, which changes whenever
+    a book folder is added or removed.
+    """
+    root = books_dir()
+    if not os.path.exists(root):
+        return [], set()
+
+    mtime = os.stat(root).st_mtime_ns
+    if (
+        _LIBRARY_CACHE["data"] is not None
+        and _LIBRARY_CACHE["dir"] == root
+        and _LIBRARY_CACHE["mtime"] == mtime
+    ):
+        return _LIBRARY_CACHE["data"]
+
+    with _LIBRARY_LOCK:
+        return _rebuild_library_listing(mtime)
+
+
+def _rebuild_library_listing(mtime: int) -> tuple[List[Dict[str, Any]], set]:
+    """Rebuild the scan_library result; call with _LIBRARY_LOCK held."""
     books = []
     all_tags = set()
+
+    # Scan directory for folders ending in '_data'
+    root = books_dir()
+    with os.scandir(root) as entries:
+        folders = [
+            entry.name
+            for entry in entries
+            if entry.name.endswith("_data") and entry.is_dir(follow_symlinks=False)
+        ]
+    metas = {item: load_book_meta(item) for item in folders}
+    # One stat per book, shared by the checks, loads and meta writes below
+    pickle_mtimes = {item: book_pickle_mtime(item) for item in folders}
+
+    # No meta.json yet, or the pickle changed since it was written (e.g. the
+    # book was re-processed with the CLI): load those pickles to refresh it.
+    # Reads and unpickling overlap well across threads on a cold library.
+    missing = [
+        item for item, meta in metas.items()
+        if (meta or {}).get("mtime") != pickle_mtimes[item]
+    ]
+    def load(item: str) -> Optional[Book]:
+        return load_book_cached(item, scan=True, mtime=pickle_mtimes[item])
+
+    if len(missing) > 1:
+        # Executor threads don't inherit our context (and with it books_dir())
+        with ThreadPoolExecutor(max_workers=LIBRARY_SCAN_WORKERS) as pool:
+            futures = [pool.submit(copy_context().run, load, item) for item in missing]
+            loaded = [future.result() for future in futures]
+    else:
+        loaded = [load(item) for item in missing]
+    for item, book in zip(missing, loaded):
+        metas[item] = save_book_meta(item, book, pickle_mtimes[item]) if book else None
+
+    for item in folders:
+        meta = metas[item]
+        if meta is None:
+            continue
+
+        all_tags.update(meta["tags"])
+        books.append({
+            "id": item,
+            "title": meta["title"],
+            "author": ", ".join(meta["authors"]),
+            "chapters": meta["chapters"],
+            "tags": meta["tags"],
+            "cover_image": meta["cover_image"],
+            "processed_at": meta["processed_at"],
+            "source_digest": meta.get("source_digest"),
+        })
+
+    _LIBRARY_CACHE.update({"dir": root, "mtime": mtime, "data": (books, all_tags)})
+    return books, all_tags
+
+
+@app.get("/", response_class=HTMLResponse)
+def library_view(request: Request):
+    """Lists all available processed books."""
     progress_data = load_progress()
+    library_books, all_tags = scan_library()
 
-    # Scan directory for folders ending in '_data' that have a book.pkl
-    if os.path.exists(BOOKS_DIR):
-        for item in os.listdir(BOOKS_DIR):
-            item_path = os.path.join(BOOKS_DIR, item)
-            if item.endswith("_data") and os.path.isdir(item_path):
-                # Try to load it to get the title
-                book = load_book_cached(item)
-                if book:
-                    tags = getattr(book.metadata, 'tags', [])
-                    all_tags.update(tags)
-                    cover_image = find_cover_image(book, item)
-                    book_progress = progress_data.get(item, {})
-                    books.append({
-                        "id": item,
-                        "title": book.metadata.title,
-                        "author": ", ".join(book.metadata.authors),
-                        "chapters": len(book.spine),
-                        "tags": tags,
-                        "cover_image": cover_image,
-                        "processed_at": getattr(book, 'processed_at', '2000-01-01'),
-                        "progress": book_progress.get("percent_complete", 0),
-                        "last_chapter": book_progress.get("chapter_index", 0),
-                        "completed": book_progress.get("completed", False)
-                    })
+    books = []
+    for book in library_books:
+        book_progress = progress_data.get(book["id"], {})
+        books.append({
+            **book,
+            "progress": book_progress.get("percent_complete", 0),
+            "last_chapter": book_progress.get("chapter_index", 0),
+            "completed": book_progress.get("completed", False)
+        })
 
     # Sort books by processed_at descending (newest first)
     books.sort(key=lambda b: b['processed_at'], reverse=True)
@@ -602,30 +1371,56 @@ async def library_view(request: Request):
 @app.get("/read/{book_id}", response_class=HTMLResponse)
 async def redirect_to_first_chapter(book_id: str):
     """Helper to just go to chapter 0."""
-    return RedirectResponse(url=f"/read/{book_id}/0", status_code=302)
+    return RedirectResponse(url=f"/reader/read/{book_id}/0", status_code=302)
 
 
-@app.get("/read/{book_id}/images/{image_name:path}")
-async def serve_image(book_id: str, image_name: str):
+class BookImageFiles(StaticFiles):
     """
     Serves images specifically for a book.
     The HTML contains <img src="images/pic.jpg">.
-    The browser resolves this to /read/{book_id}/images/pic.jpg.
-    Must be defined BEFORE the chapter route to take precedence.
+    The browser resolves this to /read/{book_id}/images/pic.jpg, which is
+    looked up in BOOKS_DIR/{book_id}/images/. Mounted once for all books;
+    StaticFiles provides ETag/Last-Modified handling (304s), HEAD and range
+    requests, and keeps paths from escaping the book folder.
     """
-    safe_book_id = os.path.basename(book_id)
-    safe_image_name = os.path.basename(image_name)
 
-    img_path = os.path.join(BOOKS_DIR, safe_book_id, "images", safe_image_name)
+    def __init__(self):
+        super().__init__(directory=None, check_dir=False)
+
+    def get_path(self, scope) -> str:
+        # Images are stored flat, so only the last path segment matters
+        safe_book_id = os.path.basename(scope["path_params"]["book_id"])
+        safe_image_name = os.path.basename(scope["path"])
+        if {safe_book_id, safe_image_name} & {"", ".", ".."}:
+            raise HTTPException(status_code=404, detail="Image not found")
+        return os.path.join(safe_book_id, "images", safe_image_name)
+
+    def lookup_path(self, path: str) -> tuple[str, Optional[os.stat_result]]:
+        # Resolved per request so books_dir() can be changed at runtime
+        full_path = os.path.join(books_dir(), path)
+        try:
+            return full_path, os.stat(full_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return "", None
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers={"Cache-Control": IMAGE_CACHE_CONTROL},
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
 
-    if not os.path.exists(img_path):
-        raise HTTPException(status_code=404, detail="Image not found")
 
-    return FileResponse(img_path)
+# Must be mounted BEFORE the chapter route to take precedence.
+app.mount("/read/{book_id}/images", BookImageFiles(), name="book_images")
 
 
 @app.get("/read/{book_id}/{chapter_ref:path}", response_class=HTMLResponse)
-async def read_chapter(request: Request, book_id: str, chapter_ref: str):
+def read_chapter(request: Request, book_id: str, chapter_ref: str):
     """
     The main reader interface.
     chapter_ref can be either:
@@ -657,7 +1452,7 @@ async def read_chapter(request: Request, book_id: str, chapter_ref: str):
             raise HTTPException(status_code=404, detail=f"Chapter '{chapter_ref}' not found")
 
         # Redirect to canonical URL with index (preserving anchor if present)
-        redirect_url = f"/read/{book_id}/{chapter_index}"
+        redirect_url = f"/reader/read/{book_id}/{chapter_index}"
         if anchor:
             redirect_url += f"#{anchor}"
         return RedirectResponse(url=redirect_url, status_code=302)
@@ -665,13 +1460,24 @@ async def read_chapter(request: Request, book_id: str, chapter_ref: str):
     if chapter_index < 0 or chapter_index >= len(book.spine):
         raise HTTPException(status_code=404, detail="Chapter not found")
 
-    current_chapter = book.spine[chapter_index]
+    # The page depends only on the book, so reuse it until the pickle changes
+    cache_key = (os.path.join(books_dir(), book_id), chapter_index)
+    mtime = book_pickle_mtime(book_id)
+    with _CHAPTER_PAGE_CACHE_LOCK:
+        cached = _CHAPTER_PAGE_CACHE.get(cache_key)
+    if cached is not None and cached[0] == mtime:
+        return HTMLResponse(content=cached[1])
+
+    current_chapter = replace(
+        book.spine[chapter_index],
+        content=get_chapter_content(book_id, book, chapter_index),
+    )
 
     # Calculate Prev/Next links
     prev_idx = chapter_index - 1 if chapter_index > 0 else None
     next_idx = chapter_index + 1 if chapter_index < len(book.spine) - 1 else None
 
-    return templates.TemplateResponse(request, "reader.html", {
+    response = templates.TemplateResponse(request, "reader.html", {
         "book": book,
         "current_chapter": current_chapter,
         "chapter_index": chapter_index,
@@ -679,6 +1485,12 @@ async def read_chapter(request: Request, book_id: str, chapter_ref: str):
         "prev_idx": prev_idx,
         "next_idx": next_idx
     })
+    with _CHAPTER_PAGE_CACHE_LOCK:
+        try:
+            _CHAPTER_PAGE_CACHE[cache_key] = (mtime, response.body)
+        except ValueError:
+            pass  # larger than the whole cache
+    return response
 
 @app.post("/upload")
 async def upload_epub(file: UploadFile = File(...)):
@@ -694,39 +1506,53 @@ async def upload_epub(file: UploadFile = File(...)):
 
     safe_name = _sanitize_filename(file.filename, fallback_ext=ext)
     base_name = os.path.splitext(safe_name)[0]
-    out_dir = os.path.join(BOOKS_DIR, f"{base_name}_data")
-
-    if os.path.exists(out_dir):
-        raise HTTPException(status_code=409, detail="Book already exists in library")
+    out_dir = os.path.join(books_dir(), f"{base_name}_data")
 
-    temp_path = os.path.join(BOOKS_DIR, safe_name)
+    # Staged outside the books directory: a file appearing there would bump
+    # its mtime and make the next library scan rebuild the whole listing.
+    # The file keeps its name, which process_book records as source_file.
+    staging_dir = tempfile.mkdtemp(prefix="llmreader-upload-")
+    temp_path = os.path.join(staging_dir, safe_name)
+    processing = False
 
     try:
-        with open(temp_path, "wb") as buffer:
-            while True:
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                buffer.write(chunk)
-
-        if ext == ".pdf":
-            book_obj = process_pdf(temp_path, out_dir)
-        else:
-            book_obj = process_epub(temp_path, out_dir)
-        save_to_pickle(book_obj, out_dir)
-        # Clear cache so subsequent requests pick up the new book list immediately.
-        load_book_cached.cache_clear()
-    except Exception as e:
-        # Best-effort cleanup
+        await run_in_threadpool(copy_upload, file.file, temp_path)
+
+        # The same file uploaded again, under any name: hand back the book
+        # we already have instead of parsing it again
+        source_digest = await run_in_threadpool(file_digest, temp_path)
+        books, _ = await run_in_threadpool(scan_library)
+        existing = next((b for b in books if b["source_digest"] == source_digest), None)
+        if existing:
+            return {
+                "book_id": existing["id"],
+                "title": existing["title"],
+                "chapters": existing["chapters"],
+            }
+
         if os.path.exists(out_dir):
+            raise HTTPException(status_code=409, detail="Book already exists in library")
+
+        # Parsing and pickling can take a while; run them in a worker process
+        # so neither the event loop nor other requests wait on the GIL
+        processing = True
+        book_obj = await run_in_upload_pool(process_book, temp_path, out_dir)
+        book_id = os.path.basename(out_dir)
+        save_book_meta(book_id, book_obj, source_digest=source_digest)
+        seed_book_cache(book_id, book_obj)
+        invalidate_library_cache()
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Best-effort cleanup of a partly written book (never one we already had)
+        if processing and os.path.exists(out_dir):
             shutil.rmtree(out_dir, ignore_errors=True)
         raise HTTPException(status_code=500, detail=f"Failed to process upload: {e}")
     finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        shutil.rmtree(staging_dir, ignore_errors=True)
 
     return {
-        "book_id": os.path.basename(out_dir),
+        "book_id": book_id,
         "title": book_obj.metadata.title,
         "chapters": len(book_obj.spine),
     }
@@ -735,24 +1561,16 @@ async def upload_epub(file: UploadFile = File(...)):
 # --- Tag Management API ---
 
 @app.get("/api/tags")
-async def get_all_tags():
+def get_all_tags():
     """
     Returns a list of all unique tags across all books in the library.
     """
-    tags = set()
-    if os.path.exists(BOOKS_DIR):
-        for item in os.listdir(BOOKS_DIR):
-            item_path = os.path.join(BOOKS_DIR, item)
-            if item.endswith("_data") and os.path.isdir(item_path):
-                book = load_book_cached(item)
-                if book and hasattr(book.metadata, 'tags'):
-                    tags.update(book.metadata.tags)
-
+    _, tags = scan_library()
     return {"tags": sorted(tags)}
 
 
 @app.get("/api/books/{book_id}/tags")
-async def get_book_tags(book_id: str):
+def get_book_tags(book_id: str):
     """
     Returns the tags for a specific book.
     """
@@ -770,7 +1588,7 @@ async def update_book_tags(book_id: str, request: Request):
     Updates the tags for a specific book.
     Expects JSON body: {"tags": ["tag1", "tag2", ...]}
     """
-    book = load_book_cached(book_id)
+    book = await run_in_threadpool(load_book_cached, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
 
@@ -793,15 +1611,19 @@ async def update_book_tags(book_id: str, request: Request):
                 seen.add(tag)
                 unique_tags.append(tag)
 
-        # Update book metadata
-        book.metadata.tags = unique_tags
-
-        # Save updated book to pickle
-        book_path = os.path.join(BOOKS_DIR, book_id)
-        save_to_pickle(book, book_path)
-
-        # Clear cache to reload updated book
-        load_book_cached.cache_clear()
+        # Tags are stored in meta.json alone, so the (much larger) pickle
+        # isn't rewritten for a tag edit. The cached Book is shared, so
+        # write from a copy; the next load picks the new tags up from disk.
+        tagged = replace(book, metadata=replace(book.metadata, tags=unique_tags))
+        previous = await run_in_threadpool(load_book_meta, book_id) or {}
+        await run_in_threadpool(
+            save_book_meta,
+            book_id,
+            tagged,
+            source_digest=previous.get("source_digest"),
+            raise_errors=True,
+        )
+        invalidate_library_cache()
 
         return {"tags": unique_tags}
 
@@ -814,7 +1636,7 @@ async def update_book_tags(book_id: str, request: Request):
 @app.get("/api/progress")
 async def get_all_progress():
     """Get reading progress for all books."""
-    return load_progress()
+    return ORJSONResponse(load_progress())
 
 
 @app.get("/api/books/{book_id}/progress")
@@ -831,7 +1653,7 @@ async def update_book_progress(book_id: str, request: Request):
     Expects JSON body: {"chapter_index": 0, "scroll_percent": 0.5, "total_chapters": 10}
     """
     try:
-        body = await request.json()
+        body = orjson.loads(await request.body())
         chapter_index = body.get("chapter_index", 0)
         scroll_percent = body.get("scroll_percent", 0)
         total_chapters = body.get("total_chapters", 1)
@@ -840,24 +1662,22 @@ async def update_book_progress(book_id: str, request: Request):
         percent_complete = ((chapter_index + scroll_percent) / total_chapters) * 100
         percent_complete = min(100, max(0, percent_complete))
 
-        progress = load_progress()
-        existing = progress.get(book_id, {})
-
-        # Auto-mark as completed when reaching 100%
-        completed = existing.get("completed", False)
-        if percent_complete >= 100:
-            completed = True
-
-        progress[book_id] = {
-            "chapter_index": chapter_index,
-            "scroll_percent": round(scroll_percent, 4),
-            "percent_complete": round(percent_complete, 1),
-            "completed": completed,
-            "updated_at": datetime.now().isoformat()
-        }
-        save_progress(progress)
+        def apply(existing: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            # Auto-mark as completed when reaching 100%
+            completed = (existing or {}).get("completed", False)
+            if percent_complete >= 100:
+                completed = True
 
-        return progress[book_id]
+            return {
+                "chapter_index": chapter_index,
+                "scroll_percent": round(scroll_percent, 4),
+                "percent_complete": round(percent_complete, 1),
+                "completed": completed,
+                "updated_at": datetime.now().isoformat()
+            }
+
+        # Sent on every scroll; keep the file write off the event loop
+        return await run_in_threadpool(update_progress, book_id, apply)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update progress: {e}")
 
@@ -872,20 +1692,20 @@ async def toggle_book_completed(book_id: str, request: Request):
         body = await request.json()
         completed = body.get("completed", False)
 
-        progress = load_progress()
-        if book_id not in progress:
-            progress[book_id] = {
-                "chapter_index": 0,
-                "scroll_percent": 0,
-                "percent_complete": 0,
-                "completed": completed,
-                "updated_at": datetime.now().isoformat()
-            }
-        else:
-            progress[book_id]["completed"] = completed
-            progress[book_id]["updated_at"] = datetime.now().isoformat()
-
-        save_progress(progress)
+        def apply(existing: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            if existing is None:
+                return {
+                    "chapter_index": 0,
+                    "scroll_percent": 0,
+                    "percent_complete": 0,
+                    "completed": completed,
+                    "updated_at": datetime.now().isoformat()
+                }
+            existing["completed"] = completed
+            existing["updated_at"] = datetime.now().isoformat()
+            return existing
+
+        await run_in_threadpool(update_progress, book_id, apply)
         return {"completed": completed}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update completed status: {e}")
@@ -899,7 +1719,7 @@ async def delete_book(book_id: str):
     """
     # Sanitize book_id to prevent directory traversal
     safe_book_id = os.path.basename(book_id)
-    book_path = os.path.join(BOOKS_DIR, safe_book_id)
+    book_path = os.path.join(books_dir(), safe_book_id)
 
     # Verify book exists
     if not os.path.isdir(book_path) or not safe_book_id.endswith("_data"):
@@ -907,22 +1727,14 @@ async def delete_book(book_id: str):
 
     try:
         # Delete book folder (book.pkl + images/)
-        shutil.rmtree(book_path)
+        await run_in_threadpool(shutil.rmtree, book_path)
 
-        # Clean up highlights.json
-        highlights = load_highlights()
-        if safe_book_id in highlights:
-            del highlights[safe_book_id]
-            save_highlights(highlights)
+        # Clean up highlights.json and reading_progress.json, off the event
+        # loop since both wait on a lock and write files
+        await run_in_threadpool(remove_book_highlights, safe_book_id)
+        await run_in_threadpool(remove_progress, safe_book_id)
 
-        # Clean up reading_progress.json
-        progress = load_progress()
-        if safe_book_id in progress:
-            del progress[safe_book_id]
-            save_progress(progress)
-
-        # Clear book cache
-        load_book_cached.cache_clear()
+        invalidate_library_cache()
 
         return {"success": True, "message": "Book deleted successfully"}
     except Exception as e:
@@ -932,7 +1744,7 @@ async def delete_book(book_id: str):
 # --- Highlights API ---
 
 @app.get("/api/books/{book_id}/offline-package")
-async def get_offline_package(book_id: str):
+def get_offline_package(book_id: str):
     """
     Returns everything needed to download a book for offline reading.
     Includes metadata, TOC, all chapters, and image manifest.
@@ -948,7 +1760,7 @@ async def get_offline_package(book_id: str):
             "index": idx,
             "href": chapter.href,
             "title": chapter.title,
-            "html": chapter.content,
+            "html": get_chapter_content(book_id, book, idx),
         })
 
     # Build image manifest (paths for client to fetch)
@@ -972,7 +1784,7 @@ async def get_offline_package(book_id: str):
             })
         return result
 
-    return {
+    return ORJSONResponse({
         "book_id": book_id,
         "metadata": {
             "title": book.metadata.title,
@@ -984,11 +1796,11 @@ async def get_offline_package(book_id: str):
         "chapters": chapters,
         "images": images,
         "spine_len": len(book.spine),
-    }
+    })
 
 
 @app.get("/api/books/{book_id}/search")
-async def search_book(book_id: str, q: str = ""):
+def search_book(book_id: str, q: str = ""):
     """Search across all chapters of a book. Returns matches with context."""
     if len(q) < 2:
         return {"results": [], "total": 0}
@@ -1035,29 +1847,30 @@ async def search_book(book_id: str, q: str = ""):
                 "count": len(chapter_matches),
             })
 
-    return {"results": results, "total": total, "query": q}
+    return ORJSONResponse({"results": results, "total": total, "query": q})
 
 
 @app.get("/api/highlights")
-async def get_all_highlights():
+def get_all_highlights():
     """
     Returns all highlights across all books.
     """
-    highlights = load_highlights()
-    return hydrate_highlights_collection(highlights)
+    with _HIGHLIGHTS_LOCK:
+        highlights = hydrate_highlights_collection(load_highlights())
+    return ORJSONResponse(highlights)
 
 
 @app.get("/api/books/{book_id}/highlights")
-async def get_book_highlights(book_id: str):
+def get_book_highlights(book_id: str):
     """
     Returns highlights for a specific book.
     """
-    highlights = load_highlights()
-    book_highlights = [
-        hydrate_highlight_record(hl)
-        for hl in highlights.get(book_id, {}).get('highlights', [])
-    ]
-    return {"highlights": book_highlights}
+    with _HIGHLIGHTS_LOCK:
+        book_highlights = [
+            hydrate_highlight_record(hl)
+            for hl in load_highlights().get(book_id, {}).get('highlights', [])
+        ]
+    return ORJSONResponse({"highlights": book_highlights})
 
 
 @app.post("/api/books/{book_id}/highlights")
@@ -1075,12 +1888,12 @@ async def create_highlight(book_id: str, request: Request):
     }
     """
     # Verify book exists
-    book = load_book_cached(book_id)
+    book = await run_in_threadpool(load_book_cached, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
 
     try:
-        body = await request.json()
+        body = orjson.loads(await request.body())
 
         # Create highlight object
         highlight = {
@@ -1096,18 +1909,9 @@ async def create_highlight(book_id: str, request: Request):
             "tags": normalize_highlight_tags(body.get("tags", [])),
         }
 
-        # Load existing highlights
-        highlights = load_highlights()
-
-        # Initialize book entry if needed
-        if book_id not in highlights:
-            highlights[book_id] = {"highlights": []}
-
-        # Add highlight
-        highlights[book_id]["highlights"].append(highlight)
-
-        # Save
-        save_highlights(highlights)
+        await run_in_threadpool(
+            append_highlight_op, {"op": "create", "book_id": book_id, "highlight": highlight}
+        )
 
         return {"success": True, "highlight": hydrate_highlight_record(highlight)}
 
@@ -1121,33 +1925,33 @@ async def update_highlight(highlight_id: str, request: Request):
     Update a highlight (e.g., add or edit note).
     Expected JSON body: {"note": "my annotation"}
     """
-    book_id, highlight, idx = get_highlight_by_id(highlight_id)
-
-    if not highlight:
-        raise HTTPException(status_code=404, detail="Highlight not found")
-
     try:
-        body = await request.json()
+        body = orjson.loads(await request.body())
 
-        # Load highlights
-        highlights = load_highlights()
+        fields: Dict[str, Any] = {}
 
         # Update note
         if "note" in body:
-            highlights[book_id]["highlights"][idx]["note"] = body["note"]
+            fields["note"] = body["note"]
 
         # Update tags
         if "tags" in body:
-            highlights[book_id]["highlights"][idx]["tags"] = normalize_highlight_tags(body["tags"])
+            fields["tags"] = normalize_highlight_tags(body["tags"])
 
-        # Save
-        save_highlights(highlights)
+        def build_ops():
+            book_id, highlight, _ = get_highlight_by_id(highlight_id)
+            if not highlight:
+                raise HTTPException(status_code=404, detail="Highlight not found")
+            ops = []
+            if fields:
+                ops.append({"op": "update", "book_id": book_id, "id": highlight_id, "fields": fields})
+            return ops, hydrate_highlight_record({**highlight, **fields})
 
-        return {
-            "success": True,
-            "highlight": hydrate_highlight_record(highlights[book_id]["highlights"][idx])
-        }
+        highlight = await run_in_threadpool(update_highlights, build_ops)
+        return {"success": True, "highlight": highlight}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update highlight: {e}")
 
@@ -1165,7 +1969,7 @@ async def bulk_update_highlight_tags(request: Request):
     }
     """
     try:
-        body = await request.json()
+        body = orjson.loads(await request.body())
         highlight_ids = parse_highlight_ids(body.get("highlight_ids", []))
         if not highlight_ids:
             raise HTTPException(status_code=400, detail="highlight_ids must contain at least one id")
@@ -1178,17 +1982,16 @@ async def bulk_update_highlight_tags(request: Request):
         if not tags:
             raise HTTPException(status_code=400, detail="tags must contain at least one valid tag")
 
-        highlights = load_highlights()
-
-        id_set = set(highlight_ids)
         found_ids = set()
-        updated_highlights: List[Dict[str, Any]] = []
         remove_tags = set(tags)
 
-        for book_data in highlights.values():
-            for highlight in book_data.get("highlights", []):
-                highlight_id = str(highlight.get("id", ""))
-                if highlight_id not in id_set:
+        def build_ops():
+            updated_highlights: List[Dict[str, Any]] = []
+            ops: List[Dict[str, Any]] = []
+
+            for highlight_id in highlight_ids:
+                book_id, highlight, _ = get_highlight_by_id(highlight_id)
+                if highlight is None:
                     continue
 
                 found_ids.add(highlight_id)
@@ -1207,13 +2010,14 @@ async def bulk_update_highlight_tags(request: Request):
                         if len(next_tags) >= MAX_HIGHLIGHT_TAGS:
                             break
 
-                highlight["tags"] = next_tags
-                updated_highlights.append(hydrate_highlight_record(highlight))
+                ops.append({"op": "update", "book_id": book_id, "id": highlight_id, "fields": {"tags": next_tags}})
+                updated_highlights.append(hydrate_highlight_record({**highlight, "tags": next_tags}))
 
-        if not updated_highlights:
-            raise HTTPException(status_code=404, detail="No matching highlights found")
+            if not updated_highlights:
+                raise HTTPException(status_code=404, detail="No matching highlights found")
+            return ops, updated_highlights
 
-        save_highlights(highlights)
+        updated_highlights = await run_in_threadpool(update_highlights, build_ops)
 
         missing_ids = [highlight_id for highlight_id in highlight_ids if highlight_id not in found_ids]
         return {
@@ -1240,30 +2044,28 @@ async def bulk_delete_highlights(request: Request):
     }
     """
     try:
-        body = await request.json()
+        body = orjson.loads(await request.body())
         highlight_ids = parse_highlight_ids(body.get("highlight_ids", []))
         if not highlight_ids:
             raise HTTPException(status_code=400, detail="highlight_ids must contain at least one id")
 
-        highlights = load_highlights()
-        id_set = set(highlight_ids)
         found_ids = set()
 
-        for book_data in highlights.values():
-            kept_highlights = []
-            for highlight in book_data.get("highlights", []):
-                highlight_id = str(highlight.get("id", ""))
-                if highlight_id in id_set:
+        def build_ops():
+            ops: List[Dict[str, Any]] = []
+            for highlight_id in highlight_ids:
+                book_id, highlight, _ = get_highlight_by_id(highlight_id)
+                if highlight is not None:
                     found_ids.add(highlight_id)
-                    continue
-                kept_highlights.append(highlight)
-            book_data["highlights"] = kept_highlights
+                    ops.append({"op": "delete", "book_id": book_id, "id": highlight_id})
 
-        deleted_ids = [highlight_id for highlight_id in highlight_ids if highlight_id in found_ids]
-        if not deleted_ids:
-            raise HTTPException(status_code=404, detail="No matching highlights found")
+            if not ops:
+                raise HTTPException(status_code=404, detail="No matching highlights found")
+            return ops, None
 
-        save_highlights(highlights)
+        await run_in_threadpool(update_highlights, build_ops)
+
+        deleted_ids = [highlight_id for highlight_id in highlight_ids if highlight_id in found_ids]
 
         missing_ids = [highlight_id for highlight_id in highlight_ids if highlight_id not in found_ids]
         return {
@@ -1283,23 +2085,19 @@ async def delete_highlight(highlight_id: str):
     """
     Delete a highlight.
     """
-    book_id, highlight, idx = get_highlight_by_id(highlight_id)
-
-    if not highlight:
-        raise HTTPException(status_code=404, detail="Highlight not found")
+    def build_ops():
+        book_id, highlight, _ = get_highlight_by_id(highlight_id)
+        if not highlight:
+            raise HTTPException(status_code=404, detail="Highlight not found")
+        return [{"op": "delete", "book_id": book_id, "id": highlight_id}], None
 
     try:
-        # Load highlights
-        highlights = load_highlights()
-
-        # Remove highlight
-        del highlights[book_id]["highlights"][idx]
-
-        # Save
-        save_highlights(highlights)
+        await run_in_threadpool(update_highlights, build_ops)
 
         return {"success": True}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete highlight: {e}")
 
@@ -1310,11 +2108,12 @@ async def export_highlights_markdown(book_id: str = ""):
     Export highlights as Obsidian-compatible markdown.
     If book_id is provided, only export that book's highlights.
     """
-    markdown_content = export_to_obsidian_markdown(filter_book_id=book_id)
+    # Loads books and reads the highlights under their lock; keep it off the loop
+    markdown_content = await run_in_threadpool(export_to_obsidian_markdown, book_id)
 
     # Generate filename with date
     if book_id:
-        book = load_book_cached(book_id)
+        book = await run_in_threadpool(load_book_cached, book_id)
         book_slug = (book.metadata.title if book else book_id).replace(" ", "-").lower()[:40]
         filename = f"highlights-{book_slug}-{datetime.now().strftime('%Y%m%d')}.md"
     else:
@@ -1334,50 +2133,14 @@ async def highlights_page(request: Request):
     """
     Render the highlights overview page.
     """
-    highlights_data = load_highlights()
+    grouped = await run_in_threadpool(grouped_highlights)
+    books_highlights = [view for view in grouped.values() if view["found"]]
 
-    # Build a structured view for the template
-    books_highlights = []
     all_highlight_tags = set()
-
-    for book_id in sorted(highlights_data.keys()):
-        book = load_book_cached(book_id)
-        if not book:
-            continue
-
-        book_highlights = [
-            hydrate_highlight_record(hl)
-            for hl in highlights_data[book_id].get('highlights', [])
-        ]
-        if not book_highlights:
-            continue
-
-        # Group by chapter
-        by_chapter: Dict[int, List[Dict]] = {}
-        for hl in book_highlights:
-            all_highlight_tags.update(hl.get("tags", []))
-            ch_idx = hl.get('chapter_index', 0)
-            if ch_idx not in by_chapter:
-                by_chapter[ch_idx] = []
-            by_chapter[ch_idx].append(hl)
-
-        # Build chapter list with highlights
-        chapters = []
-        for ch_idx in sorted(by_chapter.keys()):
-            chapter_title = book.spine[ch_idx].title if ch_idx < len(book.spine) else f"Chapter {ch_idx + 1}"
-            chapters.append({
-                "index": ch_idx,
-                "title": chapter_title,
-                "highlights": by_chapter[ch_idx]
-            })
-
-        books_highlights.append({
-            "book_id": book_id,
-            "title": book.metadata.title,
-            "author": ", ".join(book.metadata.authors),
-            "total_highlights": len(book_highlights),
-            "chapters": chapters
-        })
+    for view in books_highlights:
+        for chapter in view["chapters"]:
+            for hl in chapter["highlights"]:
+                all_highlight_tags.update(hl.get("tags", []))
 
     return templates.TemplateResponse(request, "highlights.html", {
         "books": books_highlights,
@@ -1387,5 +2150,10 @@ async def highlights_page(request: Request):
 
 if __name__ == "__main__":
     import uvicorn
+
+    # A single process: highlights, reading progress, the caches and login
+    # rate limiting are all coordinated in memory, so don't run more workers.
+    # uvicorn[standard] provides uvloop and httptools, which uvicorn uses
+    # when they are installed.
     print("Starting server at http://127.0.0.1:8123")
     uvicorn.run(app, host="127.0.0.1", port=8123)
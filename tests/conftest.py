@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+os.environ.setdefault("LLMREADER_PASSWORD", "test-password")
+os.environ.setdefault("LLMREADER_SECRET_KEY", "test-secret-key")
+
+from fastapi.testclient import TestClient
+
+import server
+from reader3 import Book, BookMetadata, ChapterContent
+
+
+def sample_book(title: str = "Sample Book") -> Book:
+    """A two-chapter Book; chapter i reads "Needle in chapter i"."""
+    chapters = [
+        ChapterContent(
+            id=f"item_{i}",
+            href=f"chapter-{i}.xhtml",
+            title=f"Chapter {i}",
+            content=f"<h1>Chapter {i}</h1><p>Needle in chapter {i}</p>",
+            text=f"Chapter {i} Needle in chapter {i}",
+            order=i,
+        )
+        for i in range(2)
+    ]
+    return Book(
+        metadata=BookMetadata(title=title, language="en", authors=["Author"]),
+        spine=chapters,
+        toc=[],
+        images={},
+        source_file="sample.epub",
+        processed_at="2026-01-01T00:00:00",
+    )
+
+
+@pytest.fixture(scope="session")
+def client():
+    """One authenticated TestClient (and ASGI portal) shared by every test."""
+    with TestClient(server.app) as c:
+        c.cookies.set(server.COOKIE_NAME, server.create_auth_cookie())
+        yield c
+
+
+@pytest.fixture
+def isolated_library(tmp_path, monkeypatch):
+    """
+    Point books_dir(), highlights.json and reading_progress.json at tmp_path
+    (which is returned), with every server cache empty.
+    """
+    monkeypatch.setattr(server, "HIGHLIGHTS_FILE", str(tmp_path / "highlights.json"))
+    monkeypatch.setattr(server, "PROGRESS_FILE", str(tmp_path / "reading_progress.json"))
+    token = server.BOOKS_DIR_VAR.set(tmp_path.as_posix())
+    server.reset_caches()
+
+    yield tmp_path
+
+    server.BOOKS_DIR_VAR.reset(token)
+    server.reset_caches()
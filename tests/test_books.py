@@ -0,0 +1,103 @@
+import os
+import pickle
+
+import server
+from conftest import sample_book
+from reader3 import ZSTD_MAGIC, save_to_pickle
+
+
+def test_scan_load_neither_inserts_nor_promotes(isolated_library):
+    save_to_pickle(sample_book("Cached Book"), str(isolated_library / "a_data"))
+    pickle_path = os.path.join(isolated_library.as_posix(), "a_data", "book.pkl")
+
+    # A scan of an uncached book doesn't add it
+    assert server.load_book_cached("a_data", scan=True).metadata.title == "Cached Book"
+    assert pickle_path not in server._BOOK_CACHE
+
+    # Once cached by a normal load, scans read it without counting a use
+    server.load_book_cached("a_data")
+    uses = server._BOOK_CACHE.uses(pickle_path)
+    assert server.load_book_cached("a_data", scan=True) is server.load_book_cached("a_data", scan=True)
+    assert server._BOOK_CACHE.uses(pickle_path) == uses
+
+    server.load_book_cached("a_data")
+    assert server._BOOK_CACHE.uses(pickle_path) == uses + 1
+
+
+def test_book_cache_evicts_least_used():
+    cache = server.BookCache(maxsize=2)
+    cache["hot"] = 1
+    cache.get("hot")
+    cache["cold"] = 2
+    cache.peek("cold")  # peeks don't count
+    cache["new"] = 3
+
+    assert "hot" in cache
+    assert "cold" not in cache
+    assert cache.peek("new") == 3
+
+
+def assert_book_is_readable(client, book_id: str):
+    page = client.get(f"/read/{book_id}/1")
+    assert page.status_code == 200
+    assert "Needle in chapter 1" in page.text
+
+    package = client.get(f"/api/books/{book_id}/offline-package")
+    assert package.status_code == 200
+    assert [ch["html"] for ch in package.json()["chapters"]] == [
+        "<h1>Chapter 0</h1><p>Needle in chapter 0</p>",
+        "<h1>Chapter 1</h1><p>Needle in chapter 1</p>",
+    ]
+
+    search = client.get(f"/api/books/{book_id}/search", params={"q": "needle"})
+    assert search.status_code == 200
+    assert search.json()["total"] == 2
+
+
+def test_legacy_pickle_with_inline_chapters_is_readable(client, isolated_library):
+    # As written before chapters moved to chapters/ and pickles to zstd
+    book_dir = isolated_library / "legacy_data"
+    book_dir.mkdir()
+    with open(book_dir / "book.pkl", "wb") as f:
+        pickle.dump(sample_book(), f)
+
+    assert_book_is_readable(client, "legacy_data")
+
+
+def test_current_layout_is_readable(client, isolated_library):
+    save_to_pickle(sample_book(), str(isolated_library / "current_data"))
+    assert (isolated_library / "current_data" / "book.pkl").read_bytes()[:4] == ZSTD_MAGIC
+    assert (isolated_library / "current_data" / "chapters" / "1.html").exists()
+
+    assert_book_is_readable(client, "current_data")
+
+
+def test_missing_chapter_file_is_a_404(client, isolated_library):
+    save_to_pickle(sample_book(), str(isolated_library / "broken_data"))
+    os.remove(isolated_library / "broken_data" / "chapters" / "1.html")
+
+    assert client.get("/read/broken_data/0").status_code == 200
+    assert client.get("/read/broken_data/1").status_code == 404
+    assert client.get("/api/books/broken_data/offline-package").status_code == 404
+
+
+def test_tag_edit_is_saved_without_touching_the_cached_book(client, isolated_library):
+    save_to_pickle(sample_book(), str(isolated_library / "tags_data"))
+    cached = server.load_book_cached("tags_data")
+
+    resp = client.put("/api/books/tags_data/tags", json={"tags": ["Fiction", "fiction", "new"]})
+    assert resp.status_code == 200
+    assert resp.json() == {"tags": ["fiction", "new"]}
+
+    assert cached.metadata.tags == []
+    assert server.load_book_cached("tags_data").metadata.tags == ["fiction", "new"]
+
+
+def test_failed_tag_write_is_an_error(client, isolated_library):
+    save_to_pickle(sample_book(), str(isolated_library / "tags_data"))
+    # The temp file meta.json is written through can't be created
+    (isolated_library / "tags_data" / "meta.json.tmp").mkdir()
+
+    resp = client.put("/api/books/tags_data/tags", json={"tags": ["lost"]})
+    assert resp.status_code == 500
+    assert server.load_book_cached("tags_data").metadata.tags == []
@@ -0,0 +1,111 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from pathlib import Path
+
+import pytest
+
+import server
+from conftest import sample_book
+from reader3 import save_to_pickle
+
+
+@pytest.fixture
+def library(isolated_library):
+    save_to_pickle(sample_book(), str(isolated_library / "log_data"))
+    return isolated_library
+
+
+def create(client, text: str) -> str:
+    resp = client.post("/api/books/log_data/highlights", json={"text": text})
+    assert resp.status_code == 200
+    return resp.json()["highlight"]["id"]
+
+
+def test_edits_survive_a_cold_reread(client, library):
+    kept = create(client, "kept")
+    dropped = create(client, "dropped")
+    assert client.put(f"/api/highlights/{kept}", json={"note": "a note"}).status_code == 200
+    assert client.delete(f"/api/highlights/{dropped}").status_code == 200
+
+    # Nothing was written to the snapshot; it all lives in the log
+    assert not os.path.exists(server.HIGHLIGHTS_FILE)
+    assert os.path.exists(server.highlights_log_path())
+
+    server.reset_caches()
+    highlights = server.load_highlights()["log_data"]["highlights"]
+    assert [(hl["id"], hl["note"]) for hl in highlights] == [(kept, "a note")]
+
+
+def test_partial_trailing_log_line_is_skipped(client, library):
+    first = create(client, "first")
+
+    # An append interrupted mid-line
+    with open(server.highlights_log_path(), "ab") as f:
+        f.write(b'{"op": "create", "book_id": "log_data", "highl')
+
+    server.reset_caches()
+    assert [hl["id"] for hl in server.load_highlights()["log_data"]["highlights"]] == [first]
+
+    # The next append starts on a fresh line rather than extending the torn one
+    second = create(client, "second")
+    server.reset_caches()
+    ids = [hl["id"] for hl in server.read_highlights_file()["log_data"]["highlights"]]
+    assert ids == [first, second]
+
+
+def test_compaction_folds_the_log_into_the_snapshot(client, library, monkeypatch):
+    monkeypatch.setattr(server, "HIGHLIGHTS_LOG_MIN_COMPACT", 512)
+    created = [create(client, f"highlight {i}") for i in range(4)]
+    assert client.put(f"/api/highlights/{created[0]}", json={"tags": ["x"]}).status_code == 200
+    assert client.delete(f"/api/highlights/{created[1]}").status_code == 200
+
+    # Keep appending until the log outgrows the threshold and is compacted
+    log_path = server.highlights_log_path()
+    for _ in range(50):
+        if not os.path.exists(log_path):
+            break
+        created.append(create(client, "filler"))
+    assert not os.path.exists(log_path)
+
+    # The snapshot alone now holds every op
+    snapshot = json.loads(Path(server.HIGHLIGHTS_FILE).read_text(encoding="utf-8"))
+    highlights = {hl["id"]: hl for hl in snapshot["log_data"]["highlights"]}
+    assert set(highlights) == set(created) - {created[1]}
+    assert highlights[created[0]]["tags"] == ["x"]
+
+    server.reset_caches()
+    assert server.load_highlights() == snapshot
+
+
+def test_concurrent_tag_edits_are_not_lost(client, library):
+    highlight_id = create(client, "tagged")
+
+    def add_tag(i: int) -> int:
+        return client.post(
+            "/api/highlights/bulk/tags",
+            json={"highlight_ids": [highlight_id], "tags": [f"t{i}"], "mode": "add"},
+        ).status_code
+
+    # Each add reads the current tags, so they must not interleave. Pool
+    # threads don't inherit our context (books_dir()); give each a copy.
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(copy_context().run, add_tag, i) for i in range(10)]
+        assert {future.result() for future in futures} == {200}
+
+    server.reset_caches()
+    highlight = server.load_highlights()["log_data"]["highlights"][0]
+    assert sorted(highlight["tags"]) == sorted(f"t{i}" for i in range(10))
+
+
+def test_deleting_a_book_drops_its_highlights_and_progress(client, library):
+    create(client, "gone")
+    progress = {"chapter_index": 0, "scroll_percent": 0.5, "total_chapters": 1}
+    assert client.put("/api/books/log_data/progress", json=progress).status_code == 200
+
+    assert client.delete("/api/books/log_data").status_code == 200
+
+    server.reset_caches()
+    assert "log_data" not in server.load_highlights()
+    assert "log_data" not in server.load_progress()
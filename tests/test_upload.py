@@ -1,20 +1,22 @@
-from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 from pathlib import Path
-import sys
-import textwrap
+import asyncio
+import io
+import os
+import zipfile
 
-PROJECT_ROOT = Path(__file__).resolve().parents[1]
-if str(PROJECT_ROOT) not in sys.path:
-    sys.path.insert(0, str(PROJECT_ROOT))
+import httpx
+import pytest
 
 from ebooklib import epub
-from fastapi.testclient import TestClient
 
 import server
 
 
-def make_test_epub(tmp_dir: Path) -> Path:
-    """Create a tiny EPUB we can upload for tests."""
+@lru_cache(maxsize=None)
+def build_test_epub() -> bytes:
+    """Build the tiny test EPUB once per session; tests copy the bytes."""
     book = epub.EpubBook()
     book.set_identifier("id12345")
     book.set_title("Test Book")
@@ -29,114 +31,157 @@ def make_test_epub(tmp_dir: Path) -> Path:
     book.spine = ["nav", chapter]
     book.toc = (epub.Link("intro.xhtml", "Intro", "intro"),)
 
+    buf = io.BytesIO()
+    epub.write_epub(buf, book)
+
+    # Repack uncompressed (EPUB allows STORED entries) so neither this build
+    # nor the server's parse runs zlib over a few hundred bytes
+    stored = io.BytesIO()
+    with zipfile.ZipFile(buf) as src, zipfile.ZipFile(stored, "w", zipfile.ZIP_STORED) as dst:
+        for info in src.infolist():
+            dst.writestr(info.filename, src.read(info))
+    return stored.getvalue()
+
+
+def make_test_epub(tmp_dir: Path) -> Path:
+    """Create a tiny EPUB we can upload for tests."""
     out_path = tmp_dir / "sample.epub"
-    epub.write_epub(out_path, book)
+    out_path.write_bytes(build_test_epub())
     return out_path
 
 
+def build_test_pdf() -> bytes:
+    """
+    A one-page PDF with text content. Objects are concatenated as bytes and
+    the xref records their real offsets, so parsers can read the file from
+    its trailer instead of falling back to a repair scan.
+    """
+    content = b"BT /F1 24 Tf 72 100 Td (Hello PDF) Tj ET"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 300 144] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    buf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(buf))
+        buf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref_offset = len(buf)
+    buf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        buf += b"%010d 00000 n \n" % offset
+    buf += b"trailer\n<< /Root 1 0 R /Size %d >>\n" % (len(objects) + 1)
+    buf += b"startxref\n%d\n%%%%EOF\n" % xref_offset
+    return bytes(buf)
+
+
+TEST_PDF_BYTES = build_test_pdf()
+
+
 def make_test_pdf(tmp_dir: Path) -> Path:
     """Create a tiny PDF with text content."""
-    pdf_bytes = textwrap.dedent(
-        r'''
-        %PDF-1.4
-        1 0 obj
-        << /Type /Catalog /Pages 2 0 R >>
-        endobj
-        2 0 obj
-        << /Type /Pages /Kids [3 0 R] /Count 1 >>
-        endobj
-        3 0 obj
-        << /Type /Page /Parent 2 0 R /MediaBox [0 0 300 144] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>
-        endobj
-        4 0 obj
-        << /Length 44 >>
-        stream
-        BT /F1 24 Tf 72 100 Td (Hello PDF) Tj ET
-        endstream
-        endobj
-        5 0 obj
-        << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>
-        endobj
-        xref
-        0 6
-        0000000000 65535 f 
-        0000000010 00000 n 
-        0000000060 00000 n 
-        0000000110 00000 n 
-        0000000233 00000 n 
-        0000000324 00000 n 
-        trailer
-        << /Root 1 0 R /Size 6 >>
-        startxref
-        373
-        %%EOF
-        '''
-    ).strip()
-
     out_path = tmp_dir / "sample.pdf"
-    out_path.write_bytes(pdf_bytes.encode("utf-8"))
+    out_path.write_bytes(TEST_PDF_BYTES)
     return out_path
 
 
-@contextmanager
-def with_library(tmp_path: Path):
-    """Isolate BOOKS_DIR per test to avoid polluting local library."""
-    original_dir = server.BOOKS_DIR
-    server.BOOKS_DIR = tmp_path.as_posix()
-    server.load_book_cached.cache_clear()
-    client = TestClient(server.app)
-
-    try:
-        yield client
-    finally:
-        server.BOOKS_DIR = original_dir
-        server.load_book_cached.cache_clear()
-
-
-def test_upload_creates_book_and_lists(tmp_path):
-    epub_path = make_test_epub(tmp_path)
-    with with_library(tmp_path) as client:
-        with open(epub_path, "rb") as f:
-            resp = client.post(
-                "/upload",
-                files={"file": ("sample.epub", f, "application/epub+zip")},
-            )
-        assert resp.status_code == 200
-        data = resp.json()
-
-        book_dir = tmp_path / data["book_id"]
-        assert book_dir.exists()
-        assert (book_dir / "book.pkl").exists()
-
-        page = client.get("/")
-        assert page.status_code == 200
-        assert "Test Book" in page.text
+@lru_cache(maxsize=None)
+def upload_body(filename: str, data: bytes, content_type: str) -> tuple[bytes, dict]:
+    """Multipart body and headers for POST /upload, encoded once per file."""
+    request = httpx.Request(
+        "POST", "http://testserver/upload", files={"file": (filename, data, content_type)}
+    )
+    return request.read(), {"Content-Type": request.headers["Content-Type"]}
+
+
+def post_upload(client, filename: str, data: bytes, content_type: str):
+    body, headers = upload_body(filename, data, content_type)
+    return client.post("/upload", content=body, headers=headers)
+
+
+def test_upload_same_file_returns_existing_book(client, isolated_library):
+    epub_bytes = make_test_epub(isolated_library).read_bytes()
+    first = post_upload(client, "sample.epub", epub_bytes, "application/epub+zip")
+    assert first.status_code == 200
 
+    library_mtime = os.stat(isolated_library).st_mtime_ns
 
-def test_upload_pdf_creates_book(tmp_path):
-    pdf_path = make_test_pdf(tmp_path)
-    with with_library(tmp_path) as client:
-        with open(pdf_path, "rb") as f:
-            resp = client.post(
-                "/upload",
-                files={"file": ("sample.pdf", f, "application/pdf")},
-            )
-        assert resp.status_code == 200
-        data = resp.json()
-        assert "book_id" in data
+    second = post_upload(client, "renamed.epub", epub_bytes, "application/epub+zip")
+    assert second.status_code == 200
+    assert second.json()["book_id"] == first.json()["book_id"]
+    assert not (isolated_library / "renamed_data").exists()
 
-        book_dir = tmp_path / data["book_id"]
-        assert (book_dir / "book.pkl").exists()
+    # Same name too: still the existing book, not a 409
+    again = post_upload(client, "sample.epub", epub_bytes, "application/epub+zip")
+    assert again.status_code == 200
+    assert again.json()["book_id"] == first.json()["book_id"]
 
-        page = client.get("/")
-        assert "sample" in page.text or "Hello" in page.text
+    # Uploads are staged outside the library, so its listing stays cached
+    assert os.stat(isolated_library).st_mtime_ns == library_mtime
 
 
-def test_upload_rejects_non_epub(tmp_path):
-    with with_library(tmp_path) as client:
-        resp = client.post(
-            "/upload",
-            files={"file": ("not_epub.txt", b"hello", "text/plain")},
+def test_upload_different_file_under_taken_name_conflicts(client, isolated_library):
+    epub_bytes = make_test_epub(isolated_library).read_bytes()
+    pdf_bytes = make_test_pdf(isolated_library).read_bytes()
+    assert post_upload(client, "sample.pdf", pdf_bytes, "application/pdf").status_code == 200
+
+    resp = post_upload(client, "sample.epub", epub_bytes, "application/epub+zip")
+    assert resp.status_code == 409
+    assert (isolated_library / "sample_data" / "book.pkl").is_file()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_upload_epub_and_pdf_create_books(isolated_library):
+    epub_bytes = make_test_epub(isolated_library).read_bytes()
+    pdf_bytes = make_test_pdf(isolated_library).read_bytes()
+    transport = httpx.ASGITransport(app=server.app)
+    cookies = {server.COOKIE_NAME: server.create_auth_cookie()}
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver", cookies=cookies
+    ) as client:
+        # Independent uploads, so let them parse side by side
+        epub_resp, pdf_resp = await asyncio.gather(
+            post_upload(client, "book.epub", epub_bytes, "application/epub+zip"),
+            post_upload(client, "paper.pdf", pdf_bytes, "application/pdf"),
         )
-        assert resp.status_code == 400
-        assert "Only .epub or .pdf" in resp.json()["detail"]
+        assert epub_resp.status_code == 200
+        assert pdf_resp.status_code == 200
+
+        for resp in (epub_resp, pdf_resp):
+            book_pkl = os.path.join(isolated_library, resp.json()["book_id"], "book.pkl")
+            assert os.path.isfile(book_pkl)
+
+        page = await client.get("/")
+        assert page.status_code == 200
+        assert "Test Book" in page.text
+        assert "paper" in page.text or "Hello" in page.text
+
+
+def test_upload_recovers_from_broken_pool(client, isolated_library):
+    # A worker dying (e.g. OOM-killed) breaks the whole pool
+    broken = server.get_upload_pool()
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os._exit, 1).result()
+
+    epub_bytes = make_test_epub(isolated_library).read_bytes()
+    resp = post_upload(client, "sample.epub", epub_bytes, "application/epub+zip")
+    assert resp.status_code == 200
+    assert server.get_upload_pool() is not broken
+
+
+def test_upload_rejects_non_epub(client, isolated_library):
+    resp = post_upload(client, "not_epub.txt", b"hello", "text/plain")
+    assert resp.status_code == 400
+    assert "Only .epub or .pdf" in resp.json()["detail"]